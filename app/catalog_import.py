@@ -0,0 +1,110 @@
+"""Streaming bulk import of supplier catalog feeds and stock replenishment."""
+
+import csv
+import json
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from itertools import islice
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+@dataclass
+class ImportStats:
+    """Progress and throughput of an import run."""
+
+    rows: int = 0
+    chunks: int = 0
+    created: int = 0
+    skipped: int = 0
+    missing: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        """Processed rows per second so far."""
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def tick(self):
+        """Refresh elapsed time."""
+        self.elapsed = time.perf_counter() - self.started
+
+
+def _chunks(rows, chunk_size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_csv_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of up to chunk_size row dicts from a CSV file with a header."""
+    with open(path, newline="", encoding="utf-8") as feed:
+        yield from _chunks(csv.DictReader(feed), chunk_size)
+
+
+def read_jsonl_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of up to chunk_size objects from a JSON Lines file."""
+    with open(path, encoding="utf-8") as feed:
+        yield from _chunks((json.loads(line) for line in feed if line.strip()), chunk_size)
+
+
+def read_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Pick reader by file extension."""
+    if str(path).endswith((".jsonl", ".ndjson")):
+        return read_jsonl_chunks(path, chunk_size)
+    return read_csv_chunks(path, chunk_size)
+
+
+def import_products(catalog, chunks, progress=None):
+    """Upsert name/price/available_amount rows into catalog chunk by chunk."""
+    stats = ImportStats()
+    for chunk in chunks:
+        records = []
+        for row in chunk:
+            try:
+                records.append((row["name"], float(row["price"]), int(row["available_amount"])))
+            except (KeyError, TypeError, ValueError):
+                stats.skipped += 1
+        stats.created += catalog.upsert_many(records)
+        stats.rows += len(chunk)
+        stats.chunks += 1
+        stats.tick()
+        if progress:
+            progress(stats)
+    stats.tick()
+    return stats
+
+
+def replenish_stock(catalog, chunks, progress=None):
+    """Apply name/delta rows as one aggregated batch per chunk.
+
+    Deltas go through Product.restock, so concurrent checkouts keep
+    reserving stock while the feed is applied. Negative deltas are skipped.
+    """
+    stats = ImportStats()
+    for chunk in chunks:
+        deltas = defaultdict(int)
+        for row in chunk:
+            try:
+                name, delta = row["name"], int(row["delta"])
+            except (KeyError, TypeError, ValueError):
+                stats.skipped += 1
+                continue
+            if delta < 0:
+                # decrements would bypass reserve() and could oversell
+                stats.skipped += 1
+                continue
+            deltas[name] += delta
+        stats.missing += len(catalog.replenish_many(deltas))
+        stats.rows += len(chunk)
+        stats.chunks += 1
+        stats.tick()
+        if progress:
+            progress(stats)
+    stats.tick()
+    return stats
@@ -1,9 +1,13 @@
 """E-shop domain models: products, cart, orders and shipments."""
 
+import json
+import struct
+import threading
 import uuid
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 
+from app.executor import get_default_executor
 from services import ShippingService
 
 
@@ -14,6 +18,7 @@ class Product:
         self.name = name
         self.price = price
         self.available_amount = available_amount
+        self._lock = threading.Lock()
 
     def is_available(self, requested_amount):
         """Check if requested amount is available."""
@@ -21,7 +26,27 @@ class Product:
 
     def buy(self, requested_amount):
         """Decrease available amount after purchase."""
-        self.available_amount -= requested_amount
+        with self._lock:
+            self.available_amount -= requested_amount
+
+    def reserve(self, requested_amount):
+        """Atomically decrease available amount if enough is left."""
+        with self._lock:
+            if self.available_amount < requested_amount:
+                return False
+            self.available_amount -= requested_amount
+            return True
+
+    def restock(self, amount):
+        """Increase available amount, e.g. to release a reservation."""
+        with self._lock:
+            self.available_amount += amount
+
+    def update(self, price, available_amount):
+        """Replace price and available amount."""
+        with self._lock:
+            self.price = price
+            self.available_amount = available_amount
 
     def __eq__(self, other):
         return self.name == other.name
@@ -36,9 +61,87 @@ class Product:
         return self.name
 
 
+class Catalog:
+    """Ordered product registry giving every product a stable numeric index."""
+
+    def __init__(self, products=()):
+        self._products = []
+        self._index = {}
+        self._lock = threading.Lock()
+        for product in products:
+            self.add(product)
+
+    def add(self, product: Product):
+        """Register product and return its index."""
+        with self._lock:
+            if product.name not in self._index:
+                self._index[product.name] = len(self._products)
+                self._products.append(product)
+            return self._index[product.name]
+
+    def upsert_many(self, records):
+        """Create or update products from (name, price, available_amount) records.
+
+        Returns number of newly created products.
+        """
+        created = 0
+        for name, price, available_amount in records:
+            product = self.get(name)
+            if product is None:
+                product = Product(name, price, available_amount)
+                if self._products[self.add(product)] is product:
+                    created += 1
+                    continue
+                product = self.get(name)
+            product.update(price, available_amount)
+        return created
+
+    def replenish_many(self, deltas):
+        """Add stock deltas given as {name: delta}; return names not in catalog.
+
+        Deltas must not be negative: stock leaves only through reserve().
+        """
+        negative = [name for name, delta in deltas.items() if delta < 0]
+        if negative:
+            raise ValueError(f"Negative replenishment for {', '.join(negative)}")
+        missing = []
+        for name, delta in deltas.items():
+            product = self.get(name)
+            if product is None:
+                missing.append(name)
+                continue
+            product.restock(delta)
+        return missing
+
+    def get(self, name):
+        """Return product by name or None."""
+        index = self._index.get(name)
+        return None if index is None else self._products[index]
+
+    def index_of(self, product):
+        """Return index of a registered product."""
+        return self._index[product.name]
+
+    def __getitem__(self, index):
+        return self._products[index]
+
+    def __contains__(self, product):
+        return product.name in self._index
+
+    def __iter__(self):
+        return iter(self._products)
+
+    def __len__(self):
+        return len(self._products)
+
+
 class ShoppingCart:
     """Represents a shopping cart with selected products."""
 
+    FORMAT_VERSION = 1
+    _HEADER = struct.Struct("<BI")
+    _ENTRY = struct.Struct("<II")
+
     def __init__(self):
         self.products = {}
 
@@ -70,16 +173,62 @@ class ShoppingCart:
             raise Exception("Cannot place order: cart is empty")
 
         product_ids = []
+        reserved = []
 
         for product, count in self.products.items():
-            if not product.is_available(count):
+            if not product.reserve(count):
+                for reserved_product, reserved_count in reserved:
+                    reserved_product.restock(reserved_count)
                 raise Exception(f"Product {product} is out of stock")
-            product.buy(count)
+            reserved.append((product, count))
             product_ids.append(str(product))
 
         self.products.clear()
         return product_ids
 
+    def to_bytes(self, catalog: Catalog):
+        """Serialize cart as packed (product index, quantity) pairs."""
+        header = self._HEADER.pack(self.FORMAT_VERSION, len(self.products))
+        entries = b"".join(
+            self._ENTRY.pack(catalog.index_of(product), amount)
+            for product, amount in self.products.items()
+        )
+        return header + entries
+
+    @classmethod
+    def from_bytes(cls, data: bytes, catalog: Catalog):
+        """Restore cart serialized with to_bytes."""
+        if len(data) < cls._HEADER.size:
+            raise ValueError("Cart payload is shorter than its header")
+        version, count = cls._HEADER.unpack_from(data)
+        if version != cls.FORMAT_VERSION:
+            raise ValueError(f"Unsupported cart format version {version}")
+        if len(data) != cls._HEADER.size + count * cls._ENTRY.size:
+            raise ValueError(f"Cart payload of {len(data)} bytes does not hold {count} items")
+        cart = cls()
+        for index, amount in cls._ENTRY.iter_unpack(data[cls._HEADER.size:]):
+            cart.products[catalog[index]] = amount
+        return cart
+
+    def to_json(self):
+        """Serialize cart as JSON keyed by product name."""
+        return json.dumps(
+            {str(product): amount for product, amount in self.products.items()},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+
+    @classmethod
+    def from_json(cls, data: str, catalog: Catalog):
+        """Restore cart serialized with to_json."""
+        cart = cls()
+        for name, amount in json.loads(data).items():
+            product = catalog.get(name)
+            if product is None:
+                raise ValueError(f"Unknown product {name}")
+            cart.products[product] = amount
+        return cart
+
 
 @dataclass
 class Order:
@@ -103,6 +252,47 @@ class Order:
             due_date,
         )
 
+    def place_order_async(self, shipping_type, due_date: datetime = None, executor=None,
+                          submit_timeout: float = 0.0):
+        """Reserve stock now and create shipping in background.
+
+        Returns a Future with the shipping id. If shipping creation fails
+        the reserved stock is returned to the products; a failed creation
+        never leaves a shipment that will still be processed. If the
+        executor has no free slot within submit_timeout seconds, the
+        reservation is released, the cart is restored and
+        ExecutorSaturatedError is raised.
+        """
+        if not due_date:
+            due_date = datetime.now(timezone.utc) + timedelta(seconds=3)
+
+        reserved = dict(self.cart.products)
+        product_ids = self.cart.submit_cart_order()
+
+        def release_reservation():
+            for product, count in reserved.items():
+                product.restock(count)
+
+        def create_shipping():
+            try:
+                return self.shipping_service.create_shipping(
+                    shipping_type,
+                    product_ids,
+                    self.order_id,
+                    due_date,
+                )
+            except Exception:
+                release_reservation()
+                raise
+
+        try:
+            executor = executor or get_default_executor()
+            return executor.submit(create_shipping, timeout=submit_timeout)
+        except Exception:
+            release_reservation()
+            self.cart.products.update(reserved)
+            raise
+
 
 @dataclass
 class Shipment:
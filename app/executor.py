@@ -0,0 +1,49 @@
+"""Bounded background executor used for off-request-path work."""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+ORDER_EXECUTOR_WORKERS = int(os.getenv("ORDER_EXECUTOR_WORKERS", "8"))
+ORDER_EXECUTOR_QUEUE = int(os.getenv("ORDER_EXECUTOR_QUEUE", "256"))
+
+
+class ExecutorSaturatedError(RuntimeError):
+    """Raised when no submission slot frees up within the timeout."""
+
+
+class BoundedExecutor:
+    """Thread pool that caps the number of running plus queued tasks."""
+
+    def __init__(self, max_workers=ORDER_EXECUTOR_WORKERS, max_pending=ORDER_EXECUTOR_QUEUE):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="order")
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+
+    def submit(self, fn, *args, timeout=None, **kwargs):
+        """Submit task, blocking up to timeout seconds while the executor is full."""
+        if not self._slots.acquire(timeout=timeout):
+            raise ExecutorSaturatedError("Order executor is saturated")
+        try:
+            future = self._pool.submit(fn, *args, **kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def shutdown(self, wait=True):
+        """Stop accepting tasks and optionally wait for running ones."""
+        self._pool.shutdown(wait=wait)
+
+
+_DEFAULT_EXECUTOR = None
+_DEFAULT_EXECUTOR_LOCK = threading.Lock()
+
+
+def get_default_executor():
+    """Return process-wide executor, creating it on first use."""
+    global _DEFAULT_EXECUTOR  # pylint: disable=global-statement
+    with _DEFAULT_EXECUTOR_LOCK:
+        if _DEFAULT_EXECUTOR is None:
+            _DEFAULT_EXECUTOR = BoundedExecutor()
+        return _DEFAULT_EXECUTOR
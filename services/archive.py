@@ -0,0 +1,160 @@
+import gzip
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from decimal import Decimal
+from itertools import islice
+
+from .config import SHIPPING_ARCHIVE_LEAD_SECONDS
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class ShippingArchive:
+    """Cold storage of finished shipments as gzip JSON Lines files partitioned by day.
+
+    Layout: ``<root>/dt=YYYY-MM-DD/shipments.jsonl.gz`` plus an index of
+    ``<root>/_index/<bucket>.jsonl`` files mapping shipping ids, hashed into
+    ``index_buckets`` buckets, to their partition, the offset of the gzip
+    member holding them and their line within it, so a lookup decompresses
+    only up to that line. A lookup reads a single bucket; up to
+    ``cached_buckets`` of them are cached and reloaded as soon as the file
+    changes, so readers see shipments archived by other processes.
+    """
+
+    INDEX_DIR = "_index"
+
+    def __init__(self, root: str, index_buckets: int = 256, cached_buckets: int = 16):
+        self.root = root
+        self.index_buckets = index_buckets
+        self.cached_buckets = cached_buckets
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def partition_of(item):
+        return f"dt={str(item.get('created_date', ''))[:10] or 'unknown'}"
+
+    def _partition_path(self, partition):
+        return os.path.join(self.root, partition, "shipments.jsonl.gz")
+
+    def _bucket_of(self, shipping_id):
+        return zlib.crc32(str(shipping_id).encode("utf-8")) % self.index_buckets
+
+    def _bucket_path(self, bucket):
+        return os.path.join(self.root, self.INDEX_DIR, f"{bucket:03d}.jsonl")
+
+    def _load_bucket(self, bucket):
+        path = self._bucket_path(bucket)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return {}
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            cached = self._cache.get(bucket)
+            if cached is not None and cached[0] == signature:
+                self._cache.move_to_end(bucket)
+                return cached[1]
+
+        index = {}
+        with open(path, encoding="utf-8") as index_file:
+            for line in index_file:
+                entry = json.loads(line)
+                index[entry["shipping_id"]] = (entry["partition"], entry.get("offset", 0), entry.get("line"))
+
+        with self._lock:
+            self._cache[bucket] = (signature, index)
+            self._cache.move_to_end(bucket)
+            while len(self._cache) > self.cached_buckets:
+                self._cache.popitem(last=False)
+        return index
+
+    def write(self, items):
+        partitions = {}
+        for item in items:
+            partitions.setdefault(self.partition_of(item), []).append(item)
+
+        buckets = {}
+        os.makedirs(os.path.join(self.root, self.INDEX_DIR), exist_ok=True)
+        for partition, partition_items in partitions.items():
+            os.makedirs(os.path.join(self.root, partition), exist_ok=True)
+            # every append adds a gzip member; readers see one continuous stream
+            with open(self._partition_path(partition), "ab") as raw_file:
+                offset = raw_file.tell()
+                with gzip.open(raw_file, "wt", encoding="utf-8") as archive_file:
+                    for item in partition_items:
+                        archive_file.write(json.dumps(item, default=_json_default, ensure_ascii=False) + "\n")
+            for line, item in enumerate(partition_items):
+                entry = json.dumps({
+                    "shipping_id": item["shipping_id"], "partition": partition, "offset": offset, "line": line,
+                })
+                buckets.setdefault(self._bucket_of(item["shipping_id"]), []).append(entry + "\n")
+
+        # the index is written last, so a listed id is always readable
+        for bucket, entries in buckets.items():
+            with open(self._bucket_path(bucket), "a", encoding="utf-8") as index_file:
+                index_file.writelines(entries)
+
+        return sum(len(partition_items) for partition_items in partitions.values())
+
+    def get(self, shipping_id):
+        entry = self._load_bucket(self._bucket_of(shipping_id)).get(shipping_id)
+        if entry is None:
+            return None
+
+        partition, offset, line = entry
+        with open(self._partition_path(partition), "rb") as raw_file:
+            raw_file.seek(offset)
+            with gzip.open(raw_file, "rt", encoding="utf-8") as archive_file:
+                # entries written without a line number fall back to a scan of the partition
+                lines = archive_file if line is None else islice(archive_file, line, None)
+                for raw_line in lines:
+                    item = json.loads(raw_line)
+                    if item["shipping_id"] == shipping_id:
+                        return item
+        return None
+
+
+class ShippingArchiver:
+    """Moves terminal shipments from the hot table into a ShippingArchive.
+
+    DynamoDB TTL may delete an item any time after its ``expires_at``, so the
+    archiver picks up shipments ``lead_time`` seconds before they expire.
+    Run it more often than ``lead_time`` and keep the TTL longer than it.
+    """
+
+    def __init__(self, repository, archive, terminal_statuses, batch_size: int = 100,
+                 lead_time: int = SHIPPING_ARCHIVE_LEAD_SECONDS):
+        self.repository = repository
+        self.archive = archive
+        self.terminal_statuses = list(terminal_statuses)
+        self.batch_size = batch_size
+        self.lead_time = lead_time
+
+    def run(self, now: int = None):
+        expires_before = (int(time.time()) if now is None else now) + self.lead_time
+        archived = 0
+        batch = []
+        for item in self.repository.scan_finished_shipping(self.terminal_statuses, expires_before):
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                archived += self._move(batch)
+                batch = []
+        if batch:
+            archived += self._move(batch)
+        return archived
+
+    def _move(self, batch):
+        count = self.archive.write(batch)
+        # only drop from the hot table once the archive write succeeded
+        self.repository.delete_shipping_batch([item["shipping_id"] for item in batch])
+        return count
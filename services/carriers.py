@@ -0,0 +1,63 @@
+import zlib
+from dataclasses import dataclass
+
+SHIPPING_TYPES = ('Нова Пошта', 'Укр Пошта', 'Meest Express', 'Самовивіз')
+
+
+@dataclass(frozen=True)
+class Carrier:
+    """Routing and throughput settings of a single shipping type.
+
+    ``queue_name=None`` keeps the carrier on the publisher's default queue.
+    With ``shards > 1`` messages are spread over ``<queue_name>-<n>`` queues
+    by a stable hash of the shipping id.
+    """
+
+    name: str
+    queue_name: str = None
+    shards: int = 1
+    max_concurrency: int = 1
+    rate_limit: float = None
+
+    def __post_init__(self):
+        if self.shards < 1:
+            raise ValueError(f"Carrier {self.name} needs at least one shard")
+        if self.max_concurrency < 1:
+            raise ValueError(f"Carrier {self.name} needs at least one worker")
+
+    def queue_names(self):
+        if self.queue_name is None:
+            return [None]
+        if self.shards <= 1:
+            return [self.queue_name]
+        return [f"{self.queue_name}-{shard}" for shard in range(self.shards)]
+
+    def queue_for(self, shipping_id: str):
+        if self.queue_name is None or self.shards <= 1:
+            return self.queue_name
+        shard = zlib.crc32(str(shipping_id).encode("utf-8")) % self.shards
+        return f"{self.queue_name}-{shard}"
+
+
+class CarrierRegistry:
+    def __init__(self, carriers):
+        self._carriers = {carrier.name: carrier for carrier in carriers}
+
+    @classmethod
+    def default(cls):
+        return cls(Carrier(name) for name in SHIPPING_TYPES)
+
+    def __contains__(self, shipping_type):
+        return shipping_type in self._carriers
+
+    def __iter__(self):
+        return iter(self._carriers.values())
+
+    def names(self):
+        return list(self._carriers)
+
+    def get(self, shipping_type):
+        return self._carriers[shipping_type]
+
+    def queue_for(self, shipping_type, shipping_id):
+        return self._carriers[shipping_type].queue_for(shipping_id)
@@ -0,0 +1,159 @@
+import logging
+import sqlite3
+import threading
+
+from botocore.exceptions import ClientError
+
+from .config import CART_TABLE_NAME
+from .db import get_dynamodb_resource
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrentModificationError(Exception):
+    """Raised when a cart was changed by someone else since it was loaded."""
+
+
+class SQLiteCartStore:
+    """Versioned cart store backed by a SQLite file (or ``:memory:``)."""
+
+    def __init__(self, path: str = ":memory:"):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS carts ("
+            "cart_id TEXT PRIMARY KEY, payload BLOB NOT NULL, version INTEGER NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def load(self, cart_id):
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT payload, version FROM carts WHERE cart_id = ?", (cart_id,)
+            ).fetchone()
+        if row is None:
+            return None, 0
+        return bytes(row[0]), row[1]
+
+    def save(self, cart_id, payload: bytes, expected_version: int):
+        new_version = expected_version + 1
+        with self._lock, self.connection:
+            if expected_version == 0:
+                cursor = self.connection.execute(
+                    "INSERT OR IGNORE INTO carts (cart_id, payload, version) VALUES (?, ?, ?)",
+                    (cart_id, payload, new_version),
+                )
+            else:
+                cursor = self.connection.execute(
+                    "UPDATE carts SET payload = ?, version = ? WHERE cart_id = ? AND version = ?",
+                    (payload, new_version, cart_id, expected_version),
+                )
+        if cursor.rowcount == 0:
+            raise ConcurrentModificationError(f"Cart {cart_id} is not at version {expected_version}")
+        return new_version
+
+
+class DynamoDBCartStore:
+    """Versioned cart store backed by a DynamoDB table keyed by ``cart_id``."""
+
+    def __init__(self, table_name: str = CART_TABLE_NAME):
+        self.table = get_dynamodb_resource().Table(table_name)
+
+    def load(self, cart_id):
+        item = self.table.get_item(Key={"cart_id": cart_id}, ConsistentRead=True).get("Item")
+        if item is None:
+            return None, 0
+        return bytes(item["payload"]), int(item["version"])
+
+    def save(self, cart_id, payload: bytes, expected_version: int):
+        new_version = expected_version + 1
+        if expected_version == 0:
+            condition = {"ConditionExpression": "attribute_not_exists(cart_id)"}
+        else:
+            condition = {
+                "ConditionExpression": "version = :expected",
+                "ExpressionAttributeValues": {":expected": expected_version},
+            }
+        try:
+            self.table.put_item(
+                Item={"cart_id": cart_id, "payload": payload, "version": new_version},
+                **condition,
+            )
+        except ClientError as exc:
+            if exc.response["Error"]["Code"] == "ConditionalCheckFailedException":
+                raise ConcurrentModificationError(
+                    f"Cart {cart_id} is not at version {expected_version}"
+                ) from exc
+            raise
+        return new_version
+
+
+class CoalescingCartWriter:
+    """Buffers cart snapshots and writes only the latest one per cart.
+
+    A burst of add/remove calls within ``delay`` seconds results in a single
+    store write. Versions are tracked per cart for optimistic concurrency.
+    A snapshot that hits a version conflict is kept in ``conflicts`` and
+    passed to ``on_conflict(cart_id, payload)``; the caller reloads the cart,
+    merges and writes it again.
+    """
+
+    def __init__(self, store, delay: float = 0.05, on_conflict=None):
+        self.store = store
+        self.delay = delay
+        self.on_conflict = on_conflict
+        self.versions = {}
+        self.conflicts = {}
+        self._pending = {}
+        self._timer = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def load(self, cart_id):
+        payload, version = self.store.load(cart_id)
+        with self._lock:
+            self.versions[cart_id] = version
+        return payload
+
+    def write(self, cart_id, payload: bytes):
+        with self._lock:
+            self._pending[cart_id] = payload
+            self.conflicts.pop(cart_id, None)
+            if self._timer is None and self.delay is not None:
+                self._timer = threading.Timer(self.delay, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """Write pending snapshots; return ids of carts that hit a version conflict."""
+        # one flush at a time, otherwise a slow save makes the next flush use a stale version
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+
+            conflicts = []
+            for cart_id, payload in pending.items():
+                with self._lock:
+                    version = self.versions.get(cart_id, 0)
+                try:
+                    new_version = self.store.save(cart_id, payload, version)
+                except ConcurrentModificationError:
+                    # keep the unsaved snapshot until the caller reloads and writes again
+                    with self._lock:
+                        self.versions.pop(cart_id, None)
+                        if cart_id not in self._pending:
+                            self.conflicts[cart_id] = payload
+                    conflicts.append(cart_id)
+                    if self.on_conflict is not None:
+                        self.on_conflict(cart_id, payload)
+                    continue
+                with self._lock:
+                    self.versions[cart_id] = new_version
+        return conflicts
+
+    def _flush_in_background(self):
+        for cart_id in self.flush():
+            if self.on_conflict is None:
+                logger.warning("Cart %s was modified concurrently, snapshot kept in conflicts", cart_id)
@@ -2,6 +2,20 @@ import os
 
 AWS_ENDPOINT_URL = os.getenv("AWS_ENDPOINT_URL", "http://localhost:4566")
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
+AWS_CONNECT_TIMEOUT = float(os.getenv("AWS_CONNECT_TIMEOUT", "1.0"))
+AWS_MAX_ATTEMPTS = int(os.getenv("AWS_MAX_ATTEMPTS", "3"))
+SHIPPING_BACKEND_DEADLINE = float(os.getenv("SHIPPING_BACKEND_DEADLINE", "2.0"))
+# long polling keeps the request open for up to 20 seconds
+SHIPPING_POLL_DEADLINE = float(os.getenv("SHIPPING_POLL_DEADLINE", "25.0"))
 SHIPPING_TABLE_NAME = os.getenv("SHIPPING_TABLE_NAME", "ShippingTable")
 SHIPPING_QUEUE = os.getenv("SHIPPING_QUEUE_NAME", "ShippingQueue")
-
+SHIPPING_DEAD_LETTER_QUEUE = os.getenv("SHIPPING_DEAD_LETTER_QUEUE_NAME", "ShippingDeadLetterQueue")
+SHIPPING_MAX_RECEIVE_COUNT = int(os.getenv("SHIPPING_MAX_RECEIVE_COUNT", "3"))
+CART_TABLE_NAME = os.getenv("CART_TABLE_NAME", "CartTable")
+SHIPPING_TTL_SECONDS = int(os.getenv("SHIPPING_TTL_SECONDS", str(7 * 24 * 3600)))
+SHIPPING_ARCHIVE_DIR = os.getenv("SHIPPING_ARCHIVE_DIR", "shipping-archive")
+SHIPPING_ARCHIVE_LEAD_SECONDS = int(os.getenv("SHIPPING_ARCHIVE_LEAD_SECONDS", str(24 * 3600)))
+SHIPPING_PROFILE = os.getenv("SHIPPING_PROFILE", "").lower() in ("1", "true", "yes")
+SHIPPING_PROFILE_DIR = os.getenv("SHIPPING_PROFILE_DIR", "shipping-profile")
+SHIPPING_PROFILE_INTERVAL = float(os.getenv("SHIPPING_PROFILE_INTERVAL", "0.01"))
+SHIPPING_PROFILE_ALLOC_EVERY = int(os.getenv("SHIPPING_PROFILE_ALLOC_EVERY", "10"))
@@ -1,12 +1,24 @@
 import boto3
-from .config import AWS_ENDPOINT_URL, AWS_REGION
+from botocore.config import Config
 
+from .config import AWS_ENDPOINT_URL, AWS_REGION, AWS_CONNECT_TIMEOUT, AWS_MAX_ATTEMPTS, SHIPPING_BACKEND_DEADLINE
 
-def get_dynamodb_resource():
+
+def get_client_config(read_timeout: float = SHIPPING_BACKEND_DEADLINE, max_attempts: int = AWS_MAX_ATTEMPTS):
+    # clients wrapped in ResilientBackend pass max_attempts=1, so only one layer retries
+    return Config(
+        connect_timeout=min(AWS_CONNECT_TIMEOUT, read_timeout),
+        read_timeout=read_timeout,
+        retries={"max_attempts": max_attempts, "mode": "standard"},
+    )
+
+
+def get_dynamodb_resource(config: Config = None):
     return boto3.resource(
         "dynamodb",
         endpoint_url=AWS_ENDPOINT_URL,
         region_name=AWS_REGION,
         aws_access_key_id="test",
         aws_secret_access_key="test",
+        config=config or get_client_config(),
     )
@@ -0,0 +1,163 @@
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from uuid import uuid4
+
+
+class InMemoryShippingRepository:
+    """Process-local stand-in for ShippingRepository, for tests and local runs."""
+
+    def __init__(self):
+        self.items = {}
+        self._by_order = {}
+        self._lock = threading.Lock()
+
+    def get_shipping(self, shipping_id):
+        item = self.items.get(shipping_id)
+        return dict(item) if item is not None else None
+
+    def create_shipping(self, shipping_type: str, product_ids: list, order_id: str, status: str, due_date: datetime):
+        with self._lock:
+            if order_id in self._by_order:
+                return self._by_order[order_id]
+            shipping_id = str(uuid4())
+            created_date = datetime.now(timezone.utc)
+            due_date = due_date.replace(tzinfo=timezone.utc)
+            self.items[shipping_id] = {
+                "shipping_id": shipping_id,
+                "shipping_type": shipping_type,
+                "order_id": order_id,
+                "product_ids": ",".join(product_ids),
+                "shipping_status": status,
+                "created_date": created_date.isoformat(),
+                "due_date": due_date.isoformat(),
+                "created_date_ms": int(created_date.timestamp() * 1000),
+                "due_date_ms": int(due_date.timestamp() * 1000),
+            }
+            self._by_order[order_id] = shipping_id
+        return shipping_id
+
+    def update_shipping_status(self, shipping_id, status, expires_at: int = None):
+        with self._lock:
+            item = self.items.setdefault(shipping_id, {"shipping_id": shipping_id})
+            item["shipping_status"] = status
+            if expires_at is not None:
+                item["expires_at"] = expires_at
+        return {"ResponseMetadata": {"HTTPStatusCode": 200}}
+
+    def get_shipping_by_order_id(self, order_id):
+        shipping_id = self._by_order.get(order_id)
+        return self.get_shipping(shipping_id) if shipping_id else None
+
+    def scan_finished_shipping(self, statuses: list, expires_before: int = None, page_size: int = None):
+        for item in list(self.items.values()):
+            if item.get("shipping_status") not in statuses:
+                continue
+            if expires_before is not None and item.get("expires_at", expires_before + 1) > expires_before:
+                continue
+            yield dict(item)
+
+    def delete_shipping_batch(self, shipping_ids: list):
+        with self._lock:
+            for shipping_id in shipping_ids:
+                item = self.items.pop(shipping_id, None)
+                if item is not None:
+                    self._by_order.pop(item.get("order_id"), None)
+
+
+class InMemoryShippingPublisher:
+    """Process-local stand-in for ShippingPublisher.
+
+    Messages that were polled but not acknowledged become visible again on
+    the next poll, mimicking an expired visibility timeout.
+    """
+
+    def __init__(self):
+        self.queue = deque()
+        self.dead_letters = []
+        self._in_flight = {}
+        self._receive_counts = {}
+        self._lock = threading.Lock()
+
+    def send_new_shipping(self, shipping_id: str, queue_name: str = None):
+        message_id = str(uuid4())
+        with self._lock:
+            self.queue.append((message_id, shipping_id))
+        return message_id
+
+    def poll_shipping(self, batch_size: int = 10):
+        return [msg['body'] for msg in self.poll_shipping_messages(batch_size)]
+
+    def poll_shipping_messages(self, batch_size: int = 10):
+        with self._lock:
+            self.queue.extend(self._in_flight.values())
+            self._in_flight.clear()
+            messages = []
+            while self.queue and len(messages) < batch_size:
+                message_id, body = self.queue.popleft()
+                self._receive_counts[message_id] = self._receive_counts.get(message_id, 0) + 1
+                self._in_flight[message_id] = (message_id, body)
+                messages.append({
+                    'body': body,
+                    'receipt_handle': message_id,
+                    'receive_count': self._receive_counts[message_id],
+                })
+        return messages
+
+    def ack_shipping(self, receipt_handles: list):
+        with self._lock:
+            for handle in receipt_handles:
+                self._in_flight.pop(handle, None)
+                self._receive_counts.pop(handle, None)
+        return []
+
+    def close(self):
+        with self._lock:
+            self.queue.extend(self._in_flight.values())
+            self._in_flight.clear()
+
+    def send_to_dead_letter(self, shipping_id: str, reason: str):
+        self.dead_letters.append((shipping_id, reason))
+        return str(uuid4())
+
+
+class FaultInjector:
+    """Proxies a backend and injects latency and errors into its method calls.
+
+    ``error_factory`` builds the exception raised for an injected failure.
+    """
+
+    def __init__(self, target, failure_rate: float = 0.0, latency: float = 0.0, slow_rate: float = 0.0,
+                 slow_latency: float = 0.0, error_factory=ConnectionError, seed: int = None):
+        self.target = target
+        self.failure_rate = failure_rate
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_factory = error_factory
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name == 'target':
+            raise AttributeError(name)
+        attribute = getattr(self.target, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            with self._lock:
+                self.calls += 1
+                failing = self._rng.random() < self.failure_rate
+                slow = self._rng.random() < self.slow_rate
+            delay = self.latency + (self.slow_latency if slow else 0.0)
+            if delay:
+                time.sleep(delay)
+            if failing:
+                raise self.error_factory(f"Injected failure in {name}")
+            return attribute(*args, **kwargs)
+
+        return call
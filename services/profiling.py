@@ -0,0 +1,177 @@
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+
+from .config import SHIPPING_PROFILE, SHIPPING_PROFILE_DIR, SHIPPING_PROFILE_INTERVAL, SHIPPING_PROFILE_ALLOC_EVERY
+
+
+class StackSampler:
+    """Samples the stacks of all other threads and aggregates them as collapsed stacks.
+
+    Overhead is bounded by the sampling ``interval`` and ``max_depth``; the
+    sampled threads are never paused beyond the GIL hand-off.
+    """
+
+    def __init__(self, interval: float = SHIPPING_PROFILE_INTERVAL, max_depth: int = 64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self.sample(exclude=own_id)
+
+    def sample(self, exclude: int = None):
+        collapsed = []
+        for thread_id, frame in sys._current_frames().items():  # pylint: disable=protected-access
+            if thread_id == exclude:
+                continue
+            names = []
+            while frame is not None and len(names) < self.max_depth:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            collapsed.append(";".join(reversed(names)))
+        with self._lock:
+            self.stacks.update(collapsed)
+            self.samples += 1
+
+    def write_collapsed(self, path: str):
+        with self._lock:
+            stacks = list(self.stacks.items())
+        with open(path, "w", encoding="utf-8") as output:
+            for stack, count in sorted(stacks):
+                output.write(f"{stack} {count}\n")
+
+
+class AllocationTracker:
+    """Records the top allocation sites of every n-th batch with tracemalloc.
+
+    Tracing is switched on only for the duration of a sampled batch, and only
+    one batch is traced at a time; the other batches run untraced. tracemalloc
+    is process wide, so while a batch is sampled the allocations of every
+    other thread, e.g. other workers of a pool, are recorded as well.
+    """
+
+    def __init__(self, top: int = 20, frames: int = 1, every: int = SHIPPING_PROFILE_ALLOC_EVERY):
+        self.top = top
+        self.frames = frames
+        self.every = max(every, 1)
+        self.batches = 0
+        self.top_sites = []
+        self._lock = threading.Lock()
+        self._tracing = threading.Lock()
+
+    @contextmanager
+    def track(self):
+        with self._lock:
+            self.batches += 1
+            sampled = self.batches % self.every == 0
+        # tracemalloc is process wide, so never interfere with someone else's tracing
+        if not sampled or tracemalloc.is_tracing() or not self._tracing.acquire(blocking=False):
+            yield
+            return
+        try:
+            tracemalloc.start(self.frames)
+            try:
+                yield
+            finally:
+                # live allocations made by any thread while this batch ran
+                snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+                top_sites = snapshot.statistics("lineno")[:self.top]
+                if top_sites:
+                    # an idle batch must not wipe the last useful report
+                    with self._lock:
+                        self.top_sites = top_sites
+        finally:
+            self._tracing.release()
+
+    def write_top(self, path: str):
+        with self._lock:
+            top_sites = list(self.top_sites)
+        with open(path, "w", encoding="utf-8") as output:
+            output.write("# allocations of all threads during sampled batches\n")
+            for stat in top_sites:
+                output.write(f"{stat}\n")
+
+
+_ENV_PROFILER = None
+_ENV_PROFILER_LOCK = threading.Lock()
+
+
+class ShippingProfiler:
+    """Opt-in profiling of the shipping worker: stack samples plus per-batch allocations."""
+
+    def __init__(self, output_dir: str = SHIPPING_PROFILE_DIR, sampler: StackSampler = None,
+                 allocations: AllocationTracker = None, flush_every: int = 100):
+        self.output_dir = output_dir
+        self.sampler = sampler or StackSampler()
+        self.allocations = allocations or AllocationTracker()
+        self.flush_every = flush_every
+        self.batches = 0
+        self.batch_seconds = 0.0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Return the process-wide profiler when SHIPPING_PROFILE is set, otherwise None."""
+        global _ENV_PROFILER  # pylint: disable=global-statement
+        if not SHIPPING_PROFILE:
+            return None
+        with _ENV_PROFILER_LOCK:
+            if _ENV_PROFILER is None:
+                _ENV_PROFILER = cls()
+                _ENV_PROFILER.start()
+            return _ENV_PROFILER
+
+    def start(self):
+        self.sampler.start()
+
+    def stop(self):
+        self.sampler.stop()
+        self.flush()
+
+    @contextmanager
+    def batch(self):
+        started = time.perf_counter()
+        try:
+            with self.allocations.track():
+                yield
+        finally:
+            # failed batches count too, otherwise a failing worker never flushes
+            with self._lock:
+                self.batches += 1
+                self.batch_seconds += time.perf_counter() - started
+                due = self.batches % self.flush_every == 0
+            if due:
+                self.flush()
+
+    def flush(self):
+        # workers of a pool share the profiler and write the same files
+        with self._flush_lock:
+            os.makedirs(self.output_dir, exist_ok=True)
+            self.sampler.write_collapsed(os.path.join(self.output_dir, "stacks.collapsed"))
+            self.allocations.write_top(os.path.join(self.output_dir, "allocations.txt"))
@@ -1,37 +1,204 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import boto3
 
-from .config import AWS_ENDPOINT_URL, AWS_REGION, SHIPPING_QUEUE
+from .config import (
+    AWS_ENDPOINT_URL, AWS_MAX_ATTEMPTS, AWS_REGION, SHIPPING_QUEUE, SHIPPING_DEAD_LETTER_QUEUE, SHIPPING_POLL_DEADLINE
+)
+from .db import get_client_config
+
+
+class AdaptivePollingPolicy:
+    """Sizes receives from the observed queue depth and backs off while the queue is idle."""
+
+    MAX_BATCH_SIZE = 10
+    MAX_WAIT_TIME = 20
+
+    def __init__(self, min_wait_time: int = 1, max_idle_delay: float = 30.0, depth_refresh_interval: int = 5):
+        self.min_wait_time = min_wait_time
+        self.max_idle_delay = max_idle_delay
+        self.depth_refresh_interval = depth_refresh_interval
+        self.queue_depth = None
+        self.consecutive_empty = 0
+        self.polls_since_refresh = 0
+
+    def needs_depth_refresh(self):
+        return self.queue_depth is None or self.polls_since_refresh >= self.depth_refresh_interval
+
+    def update_depth(self, depth: int):
+        self.queue_depth = depth
+        self.polls_since_refresh = 0
+
+    def batch_size(self):
+        if not self.queue_depth:
+            return self.MAX_BATCH_SIZE
+        return max(1, min(self.MAX_BATCH_SIZE, self.queue_depth))
+
+    def wait_time(self):
+        # a busy queue returns immediately anyway; an idle one should hold the connection open
+        if self.queue_depth and self.queue_depth >= self.MAX_BATCH_SIZE:
+            return self.min_wait_time
+        return self.MAX_WAIT_TIME
+
+    def idle_delay(self):
+        if self.consecutive_empty < 2:
+            return 0.0
+        return min(self.max_idle_delay, 2.0 ** (self.consecutive_empty - 2))
+
+    def record(self, received: int):
+        self.polls_since_refresh += 1
+        if received:
+            self.consecutive_empty = 0
+        else:
+            self.consecutive_empty += 1
+            # an empty receive means the cached depth is stale
+            self.queue_depth = 0
 
 
 class ShippingPublisher:
-    def __init__(self):
-        self.client = boto3.client(
+    def __init__(self, polling_policy: AdaptivePollingPolicy = None, prefetch: bool = False,
+                 queue_name: str = SHIPPING_QUEUE, max_attempts: int = AWS_MAX_ATTEMPTS):
+        self.client = self._create_client(get_client_config(max_attempts=max_attempts))
+        self.poll_client = self._create_client(get_client_config(SHIPPING_POLL_DEADLINE, max_attempts))
+        response = self.client.create_queue(QueueName=queue_name)
+        self.queue_url = response["QueueUrl"]
+        self._queue_urls = {queue_name: self.queue_url}
+        response = self.client.create_queue(QueueName=SHIPPING_DEAD_LETTER_QUEUE)
+        self.dead_letter_queue_url = response["QueueUrl"]
+        self.polling_policy = polling_policy
+        self.sleep = time.sleep
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        self._prefetched = None
+
+    @staticmethod
+    def _create_client(config):
+        return boto3.client(
             "sqs",
             endpoint_url=AWS_ENDPOINT_URL,
             region_name=AWS_REGION,
             aws_access_key_id="test",
             aws_secret_access_key="test",
+            config=config,
         )
-        response = self.client.create_queue(QueueName=SHIPPING_QUEUE)
-        self.queue_url = response["QueueUrl"]
 
-    def send_new_shipping(self, shipping_id: str):
+    def get_queue_url(self, queue_name: str):
+        if queue_name not in self._queue_urls:
+            self._queue_urls[queue_name] = self.client.create_queue(QueueName=queue_name)["QueueUrl"]
+        return self._queue_urls[queue_name]
+
+    def send_new_shipping(self, shipping_id: str, queue_name: str = None):
+        queue_url = self.get_queue_url(queue_name) if queue_name else self.queue_url
         response = self.client.send_message(
-            QueueUrl=self.queue_url,
+            QueueUrl=queue_url,
             MessageBody=shipping_id
         )
 
         return response['MessageId']
 
     def poll_shipping(self, batch_size: int = 10):
-        messages = self.client.receive_message(
+        return [msg['body'] for msg in self.poll_shipping_messages(batch_size)]
+
+    def get_queue_depth(self):
+        response = self.client.get_queue_attributes(
             QueueUrl=self.queue_url,
-            MessageAttributeNames=['All'],
+            AttributeNames=['ApproximateNumberOfMessages']
+        )
+        return int(response['Attributes']['ApproximateNumberOfMessages'])
+
+    def poll_shipping_messages(self, batch_size: int = 10):
+        prefetched, self._prefetched = self._prefetched, None
+        if prefetched is not None:
+            # a failed prefetch is raised once; the next poll sends a fresh receive
+            messages = prefetched.result()
+        else:
+            messages = self._receive(batch_size)
+
+        if self._prefetch_executor is not None:
+            # issue the next receive while the caller processes this batch
+            self._prefetched = self._prefetch_executor.submit(self._receive, batch_size)
+
+        return messages
+
+    def _receive(self, batch_size: int):
+        policy = self.polling_policy
+        wait_time = 10
+        if policy is not None:
+            delay = policy.idle_delay()
+            if delay:
+                self.sleep(delay)
+            if policy.needs_depth_refresh():
+                policy.update_depth(self.get_queue_depth())
+            batch_size = policy.batch_size()
+            wait_time = policy.wait_time()
+
+        messages = self.poll_client.receive_message(
+            QueueUrl=self.queue_url,
+            AttributeNames=['ApproximateReceiveCount'],
             MaxNumberOfMessages=batch_size,
-            WaitTimeSeconds=10
+            WaitTimeSeconds=wait_time
         )
 
+        if policy is not None:
+            policy.record(len(messages.get('Messages', [])))
+
         if 'Messages' not in messages:
             return []
 
-        return [msg['Body'] for msg in messages['Messages']]
+        return [
+            {
+                'body': msg['Body'],
+                'receipt_handle': msg['ReceiptHandle'],
+                'receive_count': int(msg.get('Attributes', {}).get('ApproximateReceiveCount', 1)),
+            }
+            for msg in messages['Messages']
+        ]
+
+    def ack_shipping(self, receipt_handles: list):
+        failed = []
+        # SQS accepts at most 10 entries per batch delete
+        for start in range(0, len(receipt_handles), 10):
+            chunk = receipt_handles[start:start + 10]
+            response = self.client.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{'Id': str(i), 'ReceiptHandle': handle} for i, handle in enumerate(chunk)]
+            )
+            failed.extend(chunk[int(entry['Id'])] for entry in response.get('Failed', []))
+
+        return failed
+
+    def release_shipping(self, receipt_handles: list):
+        # a zero visibility timeout makes the messages receivable again right away
+        for start in range(0, len(receipt_handles), 10):
+            chunk = receipt_handles[start:start + 10]
+            self.client.change_message_visibility_batch(
+                QueueUrl=self.queue_url,
+                Entries=[
+                    {'Id': str(i), 'ReceiptHandle': handle, 'VisibilityTimeout': 0}
+                    for i, handle in enumerate(chunk)
+                ]
+            )
+
+    def close(self):
+        """Stop prefetching and hand messages of a prefetched receive back to the queue."""
+        prefetched, self._prefetched = self._prefetched, None
+        executor, self._prefetch_executor = self._prefetch_executor, None
+        if prefetched is not None and not prefetched.cancel():
+            try:
+                messages = prefetched.result()
+            except Exception:  # nothing was received, so nothing to release
+                messages = []
+            self.release_shipping([msg['receipt_handle'] for msg in messages])
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def send_to_dead_letter(self, shipping_id: str, reason: str):
+        response = self.client.send_message(
+            QueueUrl=self.dead_letter_queue_url,
+            MessageBody=shipping_id,
+            MessageAttributes={
+                'reason': {'DataType': 'String', 'StringValue': reason or 'unknown'}
+            }
+        )
+
+        return response['MessageId']
@@ -1,7 +1,8 @@
 from boto3.dynamodb.conditions import Key, Attr
 
-from .config import SHIPPING_TABLE_NAME
-from .db import get_dynamodb_resource
+from .archive import ShippingArchive
+from .config import AWS_MAX_ATTEMPTS, SHIPPING_ARCHIVE_DIR, SHIPPING_TABLE_NAME
+from .db import get_client_config, get_dynamodb_resource
 
 from uuid import uuid4
 from datetime import datetime, timezone
@@ -9,44 +10,76 @@ from datetime import datetime, timezone
 
 class ShippingRepository:
 
-    def __init__(self):
-        dynamo_resource = get_dynamodb_resource()
+    def __init__(self, archive=None, max_attempts: int = AWS_MAX_ATTEMPTS):
+        dynamo_resource = get_dynamodb_resource(get_client_config(max_attempts=max_attempts))
         self.table = dynamo_resource.Table(SHIPPING_TABLE_NAME)
+        self.archive = archive if archive is not None else ShippingArchive(SHIPPING_ARCHIVE_DIR)
 
     def get_shipping(self, shipping_id):
         response = self.table.get_item(Key={"shipping_id": shipping_id})
-        return response.get("Item")
+        item = response.get("Item")
+        if item is None and self.archive is not None:
+            return self.archive.get(shipping_id)
+        return item
 
     def create_shipping(self, shipping_type: str, product_ids: list, order_id: str, status: str, due_date: datetime):
         existing = self.get_shipping_by_order_id(order_id)
         if existing:
             return existing['shipping_id']
         shipping_id = str(uuid4())
+        created_date = datetime.now(timezone.utc)
+        due_date = due_date.replace(tzinfo=timezone.utc)
         item = {
             "shipping_id": shipping_id,
             "shipping_type": shipping_type,
             "order_id": order_id,
             "product_ids": ",".join(product_ids),
             "shipping_status": status,
-            "created_date": datetime.now(timezone.utc).isoformat(),
-            "due_date": due_date.replace(tzinfo=timezone.utc).isoformat()
+            "created_date": created_date.isoformat(),
+            "due_date": due_date.isoformat(),
+            "created_date_ms": int(created_date.timestamp() * 1000),
+            "due_date_ms": int(due_date.timestamp() * 1000),
         }
         self.table.put_item(Item=item)
         return shipping_id
 
-    def update_shipping_status(self, shipping_id, status):
+    def update_shipping_status(self, shipping_id, status, expires_at: int = None):
+        update_expression = 'SET shipping_status = :sh_status'
+        values = {':sh_status': status}
+        if expires_at is not None:
+            update_expression += ', expires_at = :expires_at'
+            values[':expires_at'] = expires_at
+
         response = self.table.update_item(
             Key={
                 'shipping_id': shipping_id,
             },
-            UpdateExpression='SET shipping_status = :sh_status',
-            ExpressionAttributeValues={
-                ':sh_status': status
-            }
+            UpdateExpression=update_expression,
+            ExpressionAttributeValues=values
         )
 
         return response
 
+    def scan_finished_shipping(self, statuses: list, expires_before: int = None, page_size: int = None):
+        condition = Attr('shipping_status').is_in(statuses)
+        if expires_before is not None:
+            condition = condition & Attr('expires_at').lte(expires_before)
+
+        kwargs = {'FilterExpression': condition}
+        if page_size is not None:
+            kwargs['Limit'] = page_size
+        while True:
+            response = self.table.scan(**kwargs)
+            yield from response.get('Items', [])
+            if 'LastEvaluatedKey' not in response:
+                return
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def delete_shipping_batch(self, shipping_ids: list):
+        with self.table.batch_writer() as batch:
+            for shipping_id in shipping_ids:
+                batch.delete_item(Key={'shipping_id': shipping_id})
+
     def get_shipping_by_order_id(self, order_id):
         response = self.table.scan(
             FilterExpression=Attr('order_id').eq(order_id)
@@ -0,0 +1,246 @@
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+from .config import SHIPPING_BACKEND_DEADLINE, SHIPPING_POLL_DEADLINE
+from .ratelimit import TokenBucket
+
+RETRYABLE_ERROR_CODES = {
+    'ProvisionedThroughputExceededException',
+    'RequestLimitExceeded',
+    'ThrottlingException',
+    'Throttling',
+    'InternalServerError',
+    'ServiceUnavailable',
+}
+
+DEFAULT_DEADLINES = {
+    'poll_shipping': SHIPPING_POLL_DEADLINE,
+    'poll_shipping_messages': SHIPPING_POLL_DEADLINE,
+    # closing a prefetching publisher waits for its receive in flight
+    'close': SHIPPING_POLL_DEADLINE,
+}
+
+# a retried write may run next to an attempt still in flight, so only
+# reads and idempotent writes are retried
+RETRIED_OPERATIONS = (
+    'get_shipping',
+    'get_shipping_by_order_id',
+    'get_queue_depth',
+    'update_shipping_status',
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the backend while the circuit breaker is open."""
+
+
+class DeadlineExceededError(TimeoutError):
+    """Raised when an operation did not finish within its deadline."""
+
+
+def is_retryable(exc):
+    if isinstance(exc, ClientError):
+        error = exc.response.get('Error', {})
+        status = exc.response.get('ResponseMetadata', {}).get('HTTPStatusCode', 0)
+        return error.get('Code') in RETRYABLE_ERROR_CODES or status >= 500
+    return isinstance(exc, (BotoCoreError, ConnectionError, TimeoutError))
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                # let a single trial request probe the backend
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+class RetryPolicy:
+    """Retries with full-jitter exponential backoff, limited by a shared retry quota.
+
+    Every retry spends one token of the quota and every success returns a
+    fraction of one, so a failing backend quickly stops receiving retries.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.05, max_delay: float = 1.0,
+                 quota: float = 10, refund: float = 0.1, rng: random.Random = None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.refund = refund
+        self.budget = TokenBucket(rate=0, capacity=quota)
+        self.rng = rng or random.Random()
+
+    def can_retry(self, attempt: int):
+        return attempt + 1 < self.max_attempts and self.budget.try_acquire(1)
+
+    def backoff(self, attempt: int):
+        return self.rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def record_success(self):
+        self.budget.deposit(self.refund)
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, percent: float):
+        with self._lock:
+            if len(self.samples) < self.min_samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+class ResilientBackend:
+    """Wraps a repository or publisher with deadlines, retries, a circuit breaker and hedged reads.
+
+    Method calls are proxied to ``target``. Only ``retried_operations`` are
+    retried. Operations listed in ``hedged_operations`` send a duplicate
+    request once the first one is slower than the observed p95 latency, and
+    return whichever finishes first. Deadlines only stop waiting, so the
+    boto3 clients must use ``db.get_client_config`` timeouts for abandoned
+    calls to release their worker thread, and ``max_attempts=1`` so botocore
+    does not retry underneath this layer.
+    """
+
+    def __init__(self, target, deadlines: dict = None, default_deadline: float = SHIPPING_BACKEND_DEADLINE,
+                 retry_policy: RetryPolicy = None, breaker: CircuitBreaker = None,
+                 hedged_operations=('get_shipping',), retried_operations=RETRIED_OPERATIONS,
+                 max_workers: int = 16, sleep=time.sleep):
+        self.target = target
+        self.deadlines = {**DEFAULT_DEADLINES, **(deadlines or {})}
+        self.default_deadline = default_deadline
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.hedged_operations = set(hedged_operations)
+        self.retried_operations = set(retried_operations)
+        self.latencies = {}
+        self.sleep = sleep
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='backend')
+
+    def __getattr__(self, name):
+        if name == 'target':
+            raise AttributeError(name)
+        attribute = getattr(self.target, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+
+        return call
+
+    def call(self, operation, *args, **kwargs):
+        if not self.breaker.allow():
+            raise CircuitOpenError(f"Backend is unavailable, {operation} rejected")
+
+        method = getattr(self.target, operation)
+        deadline = time.monotonic() + self.deadlines.get(operation, self.default_deadline)
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.breaker.record_failure()
+                raise DeadlineExceededError(f"{operation} exceeded its deadline")
+            try:
+                result = self._attempt(operation, method, args, kwargs, remaining)
+            except DeadlineExceededError:
+                self.breaker.record_failure()
+                raise
+            except Exception as exc:
+                if not is_retryable(exc):
+                    # client errors say nothing about backend health
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if operation not in self.retried_operations or not self.retry_policy.can_retry(attempt):
+                    raise
+                self.sleep(min(self.retry_policy.backoff(attempt), max(deadline - time.monotonic(), 0)))
+                attempt += 1
+                if not self.breaker.allow():
+                    raise CircuitOpenError(f"Backend is unavailable, {operation} rejected") from exc
+                continue
+
+            self.breaker.record_success()
+            self.retry_policy.record_success()
+            return result
+
+    def _timed(self, operation, method, args, kwargs):
+        started = time.monotonic()
+        result = method(*args, **kwargs)
+        self.latencies.setdefault(operation, LatencyTracker()).record(time.monotonic() - started)
+        return result
+
+    def _attempt(self, operation, method, args, kwargs, timeout):
+        started = time.monotonic()
+        futures = [self.executor.submit(self._timed, operation, method, args, kwargs)]
+
+        hedge_delay = None
+        if operation in self.hedged_operations and operation in self.latencies:
+            hedge_delay = self.latencies[operation].percentile(95)
+        if hedge_delay is not None and hedge_delay < timeout:
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done:
+                futures.append(self.executor.submit(self._timed, operation, method, args, kwargs))
+
+        error = None
+        while futures:
+            remaining = timeout - (time.monotonic() - started)
+            done, _ = wait(futures, timeout=max(remaining, 0), return_when=FIRST_COMPLETED)
+            if not done:
+                # requests still queued are dropped; running ones end at the client read timeout
+                for future in futures:
+                    future.cancel()
+                raise DeadlineExceededError(f"{operation} exceeded its deadline")
+            for future in done:
+                futures.remove(future)
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
@@ -1,6 +1,15 @@
 from .repository import ShippingRepository
 from .publisher import ShippingPublisher
+from .carriers import CarrierRegistry, SHIPPING_TYPES
+from .config import SHIPPING_MAX_RECEIVE_COUNT, SHIPPING_TTL_SECONDS
+from .profiling import ShippingProfiler
+from .resilience import CircuitOpenError, ResilientBackend, is_retryable
+from contextlib import nullcontext
 from datetime import datetime, timezone
+import logging
+import time
+
+logger = logging.getLogger(__name__)
 
 
 class ShippingService:
@@ -8,17 +17,38 @@ class ShippingService:
     SHIPPING_IN_PROGRESS: str = 'in progress'
     SHIPPING_COMPLETED: str = 'completed'
     SHIPPING_FAILED: str = 'failed'
+    TERMINAL_STATUSES = (SHIPPING_COMPLETED, SHIPPING_FAILED)
 
-    def __init__(self, repository, publisher):
+    def __init__(self, repository, publisher, max_receive_count: int = SHIPPING_MAX_RECEIVE_COUNT,
+                 carriers: CarrierRegistry = None, ttl_seconds: int = SHIPPING_TTL_SECONDS,
+                 profiler: ShippingProfiler = None):
         self.repository = repository
         self.publisher = publisher
+        self.max_receive_count = max_receive_count
+        self.carriers = carriers or CarrierRegistry.default()
+        self.ttl_seconds = ttl_seconds
+        self.profiler = profiler if profiler is not None else ShippingProfiler.from_env()
+
+    @classmethod
+    def with_resilience(cls, repository=None, publisher=None, **kwargs):
+        """Build a service whose backend calls have deadlines, retries and a circuit breaker.
+
+        The default repository and publisher are created without botocore
+        retries, since ResilientBackend retries them instead.
+        """
+        repository = repository if repository is not None else ShippingRepository(max_attempts=1)
+        publisher = publisher if publisher is not None else ShippingPublisher(max_attempts=1)
+        return cls(ResilientBackend(repository), ResilientBackend(publisher), **kwargs)
 
     @staticmethod
     def list_available_shipping_type():
-        return ['Нова Пошта', 'Укр Пошта', 'Meest Express', 'Самовивіз']
+        return list(SHIPPING_TYPES)
+
+    def available_shipping_types(self):
+        return self.carriers.names()
 
     def create_shipping(self, shipping_type, product_ids, order_id, due_date):
-        if shipping_type not in self.list_available_shipping_type():
+        if shipping_type not in self.carriers:
             raise ValueError("Shipping type is not available")
 
         if due_date <= datetime.now(timezone.utc):
@@ -28,36 +58,112 @@ class ShippingService:
         shipping_id = self.repository.create_shipping(shipping_type, product_ids, order_id, self.SHIPPING_CREATED,
                                                       due_date)
 
-        self.publisher.send_new_shipping(shipping_id)
-        self.repository.update_shipping_status(shipping_id, self.SHIPPING_IN_PROGRESS)
+        queue_name = self.carriers.queue_for(shipping_type, shipping_id)
+        try:
+            self.publisher.send_new_shipping(shipping_id, queue_name=queue_name)
+        except Exception:
+            # a timed out send may still be delivered, so cancel the shipment before reporting failure
+            self._cancel_shipping(shipping_id)
+            raise
+        try:
+            self.repository.update_shipping_status(shipping_id, self.SHIPPING_IN_PROGRESS)
+        except Exception:  # the message is queued, so the shipment goes ahead anyway
+            logger.exception("Failed to mark shipping %s in progress", shipping_id)
 
         return shipping_id
 
-    def process_shipping_batch(self):
+    def _cancel_shipping(self, shipping_id):
+        try:
+            self.fail_shipping(shipping_id)
+        except Exception:
+            logger.exception("Failed to cancel shipping %s", shipping_id)
+
+    def process_shipping_batch(self, batch_size: int = 10):
+        with self.profiler.batch() if self.profiler is not None else nullcontext():
+            return self._process_shipping_batch(batch_size)
+
+    def _process_shipping_batch(self, batch_size):
         result = []
-        shipping = self.publisher.poll_shipping()
-        for shipping_id in shipping:
-            shipping = self.process_shipping(shipping_id)
-            result.append(shipping)
+        processed = []
+        messages = self.publisher.poll_shipping_messages(batch_size)
+        # one clock reading for the whole batch
+        now_ms = int(time.time() * 1000)
+        for message in messages:
+            shipping_id = message['body']
+            try:
+                response = self.process_shipping(shipping_id, now_ms)
+            except Exception as exc:  # one bad message must not abort the batch
+                dead_lettered = False
+                if self._is_poison(exc) and message['receive_count'] >= self.max_receive_count:
+                    dead_lettered = self._dead_letter(shipping_id, str(exc))
+                    if dead_lettered:
+                        processed.append(message['receipt_handle'])
+                result.append({
+                    'shipping_id': shipping_id,
+                    'success': False,
+                    'error': str(exc),
+                    'dead_lettered': dead_lettered,
+                })
+                continue
+
+            processed.append(message['receipt_handle'])
+            result.append({'shipping_id': shipping_id, 'success': True, 'response': response})
+
+        if processed:
+            self.publisher.ack_shipping(processed)
 
         return result
 
-    def process_shipping(self, shipping_id):
+    @staticmethod
+    def _is_poison(exc):
+        # a backend outage says nothing about the message, so it is redelivered instead
+        return not (is_retryable(exc) or isinstance(exc, CircuitOpenError))
+
+    def _dead_letter(self, shipping_id, reason):
+        try:
+            self.publisher.send_to_dead_letter(shipping_id, reason)
+        except Exception:  # leave the message on the queue to be redelivered
+            logger.exception("Failed to dead-letter shipping %s", shipping_id)
+            return False
+        return True
+
+    def process_shipping(self, shipping_id, now_ms: int = None):
         shipping = self.repository.get_shipping(shipping_id)
-        if datetime.fromisoformat(shipping['due_date']) < datetime.now(timezone.utc):
+        if shipping is None:
+            raise ValueError(f"Shipping {shipping_id} does not exist")
+        if shipping.get('shipping_status') in self.TERMINAL_STATUSES:
+            # e.g. a shipment cancelled because its send failed
+            return None
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        if self._due_date_ms(shipping) < now_ms:
             return self.fail_shipping(shipping_id)
 
         return self.complete_shipping(shipping_id)
 
+    @staticmethod
+    def _due_date_ms(shipping):
+        if 'due_date_ms' in shipping:
+            return shipping['due_date_ms']
+        # shipments stored before the epoch fields were added
+        return int(datetime.fromisoformat(shipping['due_date']).timestamp() * 1000)
+
     def check_status(self, shipping_id):
         shipping = self.repository.get_shipping(shipping_id)
+        if shipping is None:
+            raise ValueError(f"Shipping {shipping_id} does not exist")
 
         return shipping['shipping_status']
 
     def fail_shipping(self, shipping_id):
-        response = self.repository.update_shipping_status(shipping_id, self.SHIPPING_FAILED)
+        response = self.repository.update_shipping_status(shipping_id, self.SHIPPING_FAILED,
+                                                          expires_at=self._expires_at())
         return response['ResponseMetadata']
 
     def complete_shipping(self, shipping_id):
-        response = self.repository.update_shipping_status(shipping_id, self.SHIPPING_COMPLETED)
+        response = self.repository.update_shipping_status(shipping_id, self.SHIPPING_COMPLETED,
+                                                          expires_at=self._expires_at())
         return response['ResponseMetadata']
+
+    def _expires_at(self):
+        return int(time.time()) + self.ttl_seconds
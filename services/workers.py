@@ -0,0 +1,97 @@
+import logging
+import threading
+
+from .ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class CarrierWorkerPool:
+    """Consumes every carrier queue with the carrier's own concurrency and rate limit.
+
+    ``service_factory(queue_name)`` must return a ShippingService whose
+    publisher polls ``queue_name`` (``None`` means the default queue).
+    Shard queues are spread over the carrier's workers and each worker polls
+    its shards in turn, so every shard is consumed even when a carrier has
+    more shards than workers. Passing a ``profiler`` profiles every worker.
+    """
+
+    def __init__(self, registry, service_factory, batch_size: int = 10, profiler=None,
+                 error_backoff: float = 0.5, max_error_backoff: float = 30.0):
+        self.registry = registry
+        self.service_factory = service_factory
+        self.batch_size = batch_size
+        self.profiler = profiler
+        self.error_backoff = error_backoff
+        self.max_error_backoff = max_error_backoff
+        self.stop_event = threading.Event()
+        self.threads = []
+
+    @staticmethod
+    def assign_queues(carrier):
+        queue_names = carrier.queue_names()
+        workers = max(carrier.max_concurrency, 1)
+        if workers >= len(queue_names):
+            assignments = [[queue_names[worker % len(queue_names)]] for worker in range(workers)]
+        else:
+            assignments = [queue_names[worker::workers] for worker in range(workers)]
+
+        consumed = {queue_name for assigned in assignments for queue_name in assigned}
+        if consumed != set(queue_names):
+            raise ValueError(f"Carrier {carrier.name} leaves queues {set(queue_names) - consumed} unconsumed")
+        return assignments
+
+    def start(self):
+        if self.profiler is not None:
+            self.profiler.start()
+        for carrier in self.registry:
+            bucket = TokenBucket(carrier.rate_limit) if carrier.rate_limit else None
+            for worker, queue_names in enumerate(self.assign_queues(carrier)):
+                services = [self.service_factory(queue_name) for queue_name in queue_names]
+                if self.profiler is not None:
+                    for service in services:
+                        service.profiler = self.profiler
+                thread = threading.Thread(
+                    target=self._run,
+                    args=(services, bucket),
+                    name=f"shipping-{carrier.name}-{worker}",
+                    daemon=True,
+                )
+                thread.start()
+                self.threads.append(thread)
+
+    def _run(self, services, bucket):
+        batch_size = self.batch_size
+        if bucket is not None:
+            batch_size = min(batch_size, max(int(bucket.capacity), 1))
+        failures = 0
+        turn = 0
+        while not self.stop_event.is_set():
+            service = services[turn % len(services)]
+            turn += 1
+            if bucket is not None:
+                bucket.acquire(batch_size)
+            try:
+                processed = service.process_shipping_batch(batch_size)
+            except Exception:  # keep the worker alive on backend errors
+                failures += 1
+                delay = min(self.max_error_backoff, self.error_backoff * 2 ** (failures - 1))
+                logger.exception("Shipping batch failed, retrying in %.1fs", delay)
+                self.stop_event.wait(delay)
+                continue
+            failures = 0
+            if bucket is not None and len(processed) < batch_size:
+                bucket.deposit(batch_size - len(processed))
+
+        for service in services:
+            # hand prefetched messages back instead of holding them invisible
+            close = getattr(service.publisher, 'close', None)
+            if close is not None:
+                close()
+
+    def stop(self, timeout: float = None):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout)
+        if self.profiler is not None:
+            self.profiler.stop()
@@ -22,6 +22,18 @@ def setup_localstack_resources():
             BillingMode="PAY_PER_REQUEST",
         )
         dynamo_client.get_waiter("table_exists").wait(TableName=SHIPPING_TABLE_NAME)
+        dynamo_client.update_time_to_live(
+            TableName=SHIPPING_TABLE_NAME,
+            TimeToLiveSpecification={"Enabled": True, "AttributeName": "expires_at"},
+        )
+    if CART_TABLE_NAME not in existing_tables:
+        dynamo_client.create_table(
+            TableName=CART_TABLE_NAME,
+            KeySchema=[{"AttributeName": "cart_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "cart_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        dynamo_client.get_waiter("table_exists").wait(TableName=CART_TABLE_NAME)
     sqs_client = boto3.client(
         "sqs",
         endpoint_url=AWS_ENDPOINT_URL, region_name=AWS_REGION,
@@ -30,11 +42,15 @@ def setup_localstack_resources():
     )
     response = sqs_client.create_queue(QueueName=SHIPPING_QUEUE)
     queue_url = response["QueueUrl"]
+    response = sqs_client.create_queue(QueueName=SHIPPING_DEAD_LETTER_QUEUE)
+    dead_letter_queue_url = response["QueueUrl"]
 
     yield  # Всі тести йдуть тут
 
     dynamo_client.delete_table(TableName=SHIPPING_TABLE_NAME)
+    dynamo_client.delete_table(TableName=CART_TABLE_NAME)
     sqs_client.delete_queue(QueueUrl=queue_url)
+    sqs_client.delete_queue(QueueUrl=dead_letter_queue_url)
 
 
 @pytest.fixture
@@ -0,0 +1,8 @@
+import sys
+
+
+def after_scenario(context, scenario):
+    # behave captures stdout of steps, so timings go straight to the console
+    report = getattr(context, "perf_report", None)
+    if report:
+        sys.__stdout__.write(f"    [perf] {scenario.name}: {report}\n")
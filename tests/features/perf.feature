@@ -0,0 +1,24 @@
+@perf
+Feature: Checkout performance
+  Checkout latency and stock consistency under concurrent load,
+  measured against the in-memory shipping backend
+
+  Scenario: Concurrent checkout over a large catalog
+    Given a catalog of 100000 products
+    And each catalog product has availability of 10
+    When 64 shoppers check out 10 orders each concurrently
+    Then p99 checkout latency is below 50 ms and no product is oversold
+
+  Scenario: Concurrent checkout of scarce products
+    Given a catalog of 10 products
+    And each catalog product has availability of 5
+    When 64 shoppers check out concurrently
+    Then p99 checkout latency is below 50 ms and no product is oversold
+    And some checkouts are rejected as out of stock
+
+  Scenario: Checkout latency stays bounded when the shipping backend degrades
+    Given a catalog of 1000 products
+    And each catalog product has availability of 1000
+    And a shipping backend where 5% of calls take 500 ms behind a 100 ms deadline
+    When 32 shoppers check out 10 orders each concurrently
+    Then p99 checkout latency is below 400 ms
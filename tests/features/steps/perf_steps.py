@@ -0,0 +1,121 @@
+import os
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from behave import given, when, then
+
+from app.eshop import Catalog, Order, Product, ShoppingCart
+from services import ShippingService
+from services.local import FaultInjector, InMemoryShippingPublisher, InMemoryShippingRepository
+from services.resilience import ResilientBackend
+
+
+@given("a catalog of {size:d} products")
+def create_catalog(context, size):
+    context.catalog = Catalog(Product(f"product-{number}", 100, 0) for number in range(size))
+
+
+@given("each catalog product has availability of {availability:d}")
+def set_catalog_availability(context, availability):
+    for product in context.catalog:
+        product.available_amount = availability
+    context.initial_amount = availability
+
+
+@given("a shipping backend where {percent:d}% of calls take {latency:d} ms behind a {deadline:d} ms deadline")
+def create_degraded_backend(context, percent, latency, deadline):
+    def degraded(backend):
+        slow = FaultInjector(backend, slow_rate=percent / 100, slow_latency=latency / 1000, seed=percent)
+        return ResilientBackend(slow, default_deadline=deadline / 1000, max_workers=64)
+
+    context.shipping_service = ShippingService(degraded(InMemoryShippingRepository()),
+                                               degraded(InMemoryShippingPublisher()))
+
+
+def checkout(context, shipping_service, rng):
+    cart = ShoppingCart()
+    picked = {}
+    for _ in range(rng.randint(1, 3)):
+        product = context.catalog[rng.randrange(len(context.catalog))]
+        picked[product] = rng.randint(1, 2)
+
+    started = time.perf_counter()
+    try:
+        for product, amount in picked.items():
+            cart.add_product(product, amount)
+        Order(cart, shipping_service, order_id=f"order-{rng.random()}").place_order(
+            shipping_service.available_shipping_types()[0]
+        )
+    except Exception:  # out of stock, either when adding or when submitting
+        return time.perf_counter() - started, None
+    return time.perf_counter() - started, picked
+
+
+@when("{shoppers:d} shoppers check out concurrently")
+def shoppers_check_out(context, shoppers):
+    shoppers_check_out_orders(context, shoppers, 1)
+
+
+@when("{shoppers:d} shoppers check out {orders:d} orders each concurrently")
+def shoppers_check_out_orders(context, shoppers, orders):
+    shipping_service = getattr(context, "shipping_service", None) or ShippingService(
+        InMemoryShippingRepository(), InMemoryShippingPublisher())
+    start = threading.Barrier(shoppers)
+
+    def shopper(seed):
+        rng = random.Random(seed)
+        start.wait()
+        return [checkout(context, shipping_service, rng) for _ in range(orders)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=shoppers) as executor:
+        results = [result for batch in executor.map(shopper, range(shoppers)) for result in batch]
+    context.elapsed = time.perf_counter() - started
+
+    context.latencies = sorted(latency for latency, _ in results)
+    context.sold = Counter()
+    context.rejected = 0
+    for _, picked in results:
+        if picked is None:
+            context.rejected += 1
+            continue
+        context.sold.update(picked)
+
+
+def percentile(values, percent):
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def check_latency(context, limit):
+    # slower machines, e.g. shared CI runners, can raise the budget
+    limit = int(os.getenv("PERF_P99_LIMIT_MS", limit))
+    p50 = percentile(context.latencies, 50) * 1000
+    p99 = percentile(context.latencies, 99) * 1000
+    context.perf_report = (
+        f"{len(context.latencies)} checkouts in {context.elapsed:.3f}s, "
+        f"p50 {p50:.2f} ms, p99 {p99:.2f} ms, rejected {context.rejected}"
+    )
+    assert p99 < limit, f"p99 checkout latency {p99:.2f} ms exceeds {limit} ms"
+
+
+@then("p99 checkout latency is below {limit:d} ms and no product is oversold")
+def check_latency_and_stock(context, limit):
+    for product in context.catalog:
+        assert product.available_amount >= 0, f"{product} is oversold"
+        assert product.available_amount == context.initial_amount - context.sold[product], \
+            f"{product} stock does not match sold amount"
+    check_latency(context, limit)
+
+
+@then("p99 checkout latency is below {limit:d} ms")
+def check_latency_only(context, limit):
+    # failed shipping calls keep their stock reserved, so stock is not compared here
+    check_latency(context, limit)
+
+
+@then("some checkouts are rejected as out of stock")
+def check_rejections(context):
+    assert context.rejected > 0
@@ -3,11 +3,13 @@ import uuid
 
 import boto3
 
-from app.eshop import Product, ShoppingCart, Order, Shipment
+from app.eshop import Catalog, Product, ShoppingCart, Order, Shipment
 import random
 from services import ShippingService
 from services.repository import ShippingRepository
 from services.publisher import ShippingPublisher
+from services.archive import ShippingArchive, ShippingArchiver
+from services.cart_store import ConcurrentModificationError, DynamoDBCartStore
 from datetime import datetime, timedelta, timezone
 from services.config import AWS_ENDPOINT_URL, AWS_REGION, SHIPPING_QUEUE
 import pytest
@@ -45,7 +47,7 @@ def test_place_order_with_mocked_repo(mocker, order_id, shipping_id):
 
     mock_repo.create_shipping.assert_called_with(ShippingService.list_available_shipping_type()[0], ["Product"],
                                                  order_id, shipping_service.SHIPPING_CREATED, due_date)
-    mock_publisher.send_new_shipping.assert_called_with(shipping_id)
+    mock_publisher.send_new_shipping.assert_called_with(shipping_id, queue_name=None)
 
 
 def test_place_order_with_unavailable_shipping_type_fails(dynamo_resource):
@@ -329,3 +331,74 @@ def test_shipping_consistency_between_repo_and_queue(dynamo_resource, sqs_client
     messages = response.get("Messages", [])
 
     assert any(shipping_id in msg["Body"] for msg in messages)
+
+
+def test_dynamodb_cart_store_round_trip_and_conflict(dynamo_resource):
+    store = DynamoDBCartStore()
+    catalog = Catalog([Product("Phone", 1000, 10), Product("Tablet", 500, 10)])
+    cart = ShoppingCart()
+    cart.add_product(catalog.get("Phone"), 2)
+    cart_id = str(uuid.uuid4())
+
+    assert store.load(cart_id) == (None, 0)
+    version = store.save(cart_id, cart.to_bytes(catalog), 0)
+    payload, loaded_version = store.load(cart_id)
+    assert loaded_version == version == 1
+    assert ShoppingCart.from_bytes(payload, catalog).products == cart.products
+
+    cart.add_product(catalog.get("Tablet"), 1)
+    assert store.save(cart_id, cart.to_bytes(catalog), version) == 2
+
+    with pytest.raises(ConcurrentModificationError):
+        store.save(cart_id, b"stale", version)
+    with pytest.raises(ConcurrentModificationError):
+        store.save(cart_id, b"new cart", 0)
+    assert store.load(cart_id) == (cart.to_bytes(catalog), 2)
+
+
+def test_finished_shipping_is_scanned_and_archived(dynamo_resource, tmp_path):
+    archive = ShippingArchive(str(tmp_path))
+    shipping_repo = ShippingRepository(archive=archive)
+    due_date = datetime.now(timezone.utc) + timedelta(minutes=1)
+    expired_at = int(time.time()) - 60
+
+    finished = []
+    for number in range(3):
+        shipping_id = shipping_repo.create_shipping(
+            "Самовивіз", ["Product"], str(uuid.uuid4()), ShippingService.SHIPPING_CREATED, due_date)
+        shipping_repo.update_shipping_status(shipping_id, ShippingService.SHIPPING_COMPLETED, expires_at=expired_at)
+        finished.append(shipping_id)
+    active_id = shipping_repo.create_shipping(
+        "Самовивіз", ["Product"], str(uuid.uuid4()), ShippingService.SHIPPING_IN_PROGRESS, due_date)
+
+    assert shipping_repo.get_shipping(finished[0])["expires_at"] == expired_at
+
+    scanned = {
+        item["shipping_id"]
+        for item in shipping_repo.scan_finished_shipping(
+            list(ShippingService.TERMINAL_STATUSES), expires_before=expired_at, page_size=1)
+    }
+    assert set(finished) <= scanned, "Scan must follow every page"
+    assert active_id not in scanned
+
+    archiver = ShippingArchiver(shipping_repo, archive, ShippingService.TERMINAL_STATUSES, lead_time=0)
+    assert archiver.run(now=expired_at) >= len(finished)
+
+    for shipping_id in finished:
+        assert "Item" not in shipping_repo.table.get_item(Key={"shipping_id": shipping_id})
+        assert shipping_repo.get_shipping(shipping_id)["shipping_status"] == ShippingService.SHIPPING_COMPLETED
+    assert shipping_repo.get_shipping(active_id) is not None
+
+
+def test_delete_shipping_batch_removes_items(dynamo_resource, tmp_path):
+    shipping_repo = ShippingRepository(archive=ShippingArchive(str(tmp_path)))
+    due_date = datetime.now(timezone.utc) + timedelta(minutes=1)
+    shipping_ids = [
+        shipping_repo.create_shipping(
+            "Самовивіз", ["Product"], str(uuid.uuid4()), ShippingService.SHIPPING_CREATED, due_date)
+        for _ in range(30)
+    ]
+
+    shipping_repo.delete_shipping_batch(shipping_ids)
+
+    assert all(shipping_repo.get_shipping(shipping_id) is None for shipping_id in shipping_ids)
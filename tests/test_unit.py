@@ -1,8 +1,26 @@
+import tempfile
+import threading
+import time
+import tracemalloc
 import unittest
 
-from unittest.mock import MagicMock
+from datetime import datetime, timedelta, timezone
+from unittest.mock import ANY, MagicMock, patch
 
-from app.eshop import ShoppingCart, Product, Order
+from app.eshop import ShoppingCart, Product, Order, Catalog
+from app.catalog_import import import_products, read_chunks, replenish_stock
+from app.executor import BoundedExecutor, ExecutorSaturatedError
+from services import ShippingService
+from services.archive import ShippingArchive, ShippingArchiver
+from services.cart_store import SQLiteCartStore, CoalescingCartWriter, ConcurrentModificationError
+from services.carriers import Carrier, CarrierRegistry
+from services.db import get_client_config
+from services.local import FaultInjector, InMemoryShippingPublisher, InMemoryShippingRepository
+from services.profiling import AllocationTracker, ShippingProfiler, StackSampler
+from services.publisher import AdaptivePollingPolicy, ShippingPublisher
+from services.ratelimit import TokenBucket
+from services.resilience import CircuitBreaker, CircuitOpenError, DeadlineExceededError, ResilientBackend, RetryPolicy
+from services.workers import CarrierWorkerPool
 
 
 class TestProduct(unittest.TestCase):
@@ -71,6 +89,129 @@ class TestShoppingCart(unittest.TestCase):
             self.cart.add_product(self.product, None)
 
 
+class TestCartSerialization(unittest.TestCase):
+    def setUp(self):
+        self.catalog = Catalog([Product('Phone', 1000, 10), Product('Tablet', 500, 10)])
+        self.cart = ShoppingCart()
+        self.cart.add_product(self.catalog.get('Tablet'), 2)
+        self.cart.add_product(self.catalog.get('Phone'), 1)
+
+    def test_bytes_round_trip(self):
+        data = self.cart.to_bytes(self.catalog)
+        self.assertEqual(len(data), 5 + 2 * 8, "Бінарний формат займає 8 байт на позицію")
+        restored = ShoppingCart.from_bytes(data, self.catalog)
+        self.assertEqual(restored.products, self.cart.products, "Корзина відновлена з байтів")
+
+    def test_truncated_bytes_are_rejected(self):
+        data = self.cart.to_bytes(self.catalog)
+        for payload in (data[:-8], data[:3], data + b'\x00'):
+            with self.assertRaises(ValueError):
+                ShoppingCart.from_bytes(payload, self.catalog)
+
+    def test_json_round_trip(self):
+        restored = ShoppingCart.from_json(self.cart.to_json(), self.catalog)
+        self.assertEqual(restored.products, self.cart.products, "Корзина відновлена з JSON")
+
+
+class TestCatalogImport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.catalog = Catalog([Product('Phone', 1000, 10)])
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write(self, name, content):
+        path = f"{self.directory.name}/{name}"
+        with open(path, 'w', encoding='utf-8') as feed:
+            feed.write(content)
+        return path
+
+    def test_csv_feed_upserts_products(self):
+        path = self.write('feed.csv', 'name,price,available_amount\nPhone,900,5\nTablet,500,3\nBroken,x,1\n')
+        progress = []
+        stats = import_products(self.catalog, read_chunks(path, chunk_size=2), progress.append)
+
+        self.assertEqual((stats.rows, stats.chunks, stats.created, stats.skipped), (3, 2, 1, 1), "Статистика імпорту")
+        self.assertEqual(len(progress), 2, "Прогрес повідомляється після кожного фрагмента")
+        self.assertEqual(self.catalog.get('Phone').price, 900, "Ціну оновлено")
+        self.assertEqual(self.catalog.get('Tablet').available_amount, 3, "Новий продукт створено")
+
+    def test_jsonl_deltas_are_aggregated(self):
+        path = self.write('deltas.jsonl', '{"name": "Phone", "delta": 2}\n{"name": "Phone", "delta": 3}\n'
+                                          '{"name": "Unknown", "delta": 1}\n')
+        self.catalog.get('Phone').restock = MagicMock(wraps=self.catalog.get('Phone').restock)
+        stats = replenish_stock(self.catalog, read_chunks(path))
+
+        self.catalog.get('Phone').restock.assert_called_once_with(5)
+        self.assertEqual(self.catalog.get('Phone').available_amount, 15, "Поповнення застосовано одним кроком")
+        self.assertEqual(stats.missing, 1, "Невідомі продукти пропущено")
+
+    def test_negative_deltas_are_skipped(self):
+        path = self.write('deltas.csv', 'name,delta\nPhone,-15\nPhone,2\n')
+        stats = replenish_stock(self.catalog, read_chunks(path))
+
+        self.assertEqual(stats.skipped, 1, "Від'ємну дельту пропущено")
+        self.assertEqual(self.catalog.get('Phone').available_amount, 12, "Залишок не став від'ємним")
+        with self.assertRaises(ValueError):
+            self.catalog.replenish_many({'Phone': -5})
+
+
+    def test_rows_without_name_are_skipped(self):
+        jsonl = self.write('deltas.jsonl', '{"delta": 5}\n{"name": "Phone", "delta": 1}\n')
+        csv_feed = self.write('deltas.csv', 'product,delta\nPhone,3\n')
+
+        self.assertEqual(replenish_stock(self.catalog, read_chunks(jsonl)).skipped, 1, "Рядок без назви пропущено")
+        self.assertEqual(replenish_stock(self.catalog, read_chunks(csv_feed)).skipped, 1, "CSV без колонки name")
+        self.assertEqual(self.catalog.get('Phone').available_amount, 11, "Коректні рядки застосовано")
+
+class TestCartStore(unittest.TestCase):
+    def setUp(self):
+        self.store = SQLiteCartStore()
+
+    def test_stale_version_is_rejected(self):
+        version = self.store.save('cart', b'a', 0)
+        self.store.save('cart', b'b', version)
+        with self.assertRaises(ConcurrentModificationError):
+            self.store.save('cart', b'c', version)
+        self.assertEqual(self.store.load('cart'), (b'b', 2), "Зберігся лише перший запис версії")
+
+    def test_burst_is_coalesced_into_one_write(self):
+        self.store.save = MagicMock(wraps=self.store.save)
+        writer = CoalescingCartWriter(self.store, delay=None)
+        for payload in (b'1', b'12', b'1'):
+            writer.write('cart', payload)
+        self.assertEqual(writer.flush(), [], "Конфліктів немає")
+        self.store.save.assert_called_once_with('cart', b'1', 0)
+
+    def test_conflicting_snapshot_is_surfaced(self):
+        self.store.save('cart', b'other', 0)
+        reported = []
+        writer = CoalescingCartWriter(self.store, delay=None, on_conflict=lambda *args: reported.append(args))
+        writer.write('cart', b'mine')
+
+        self.assertEqual(writer.flush(), ['cart'], "Конфлікт версій повідомлено")
+        self.assertEqual(reported, [('cart', b'mine')], "Колбек отримав незбережений знімок")
+        self.assertEqual(writer.conflicts, {'cart': b'mine'}, "Знімок не втрачено")
+
+        writer.load('cart')
+        writer.write('cart', b'merged')
+        self.assertEqual(writer.flush(), [], "Після перезавантаження запис успішний")
+        self.assertEqual(self.store.load('cart'), (b'merged', 2), "Збережено об'єднану корзину")
+
+
+    def test_slow_save_does_not_conflict_with_next_flush(self):
+        save = self.store.save
+        self.store.save = lambda *args: time.sleep(0.2) or save(*args)
+        writer = CoalescingCartWriter(self.store, delay=0.05)
+        writer.write('cart', b'1')
+        time.sleep(0.1)
+        writer.write('cart', b'2')
+        time.sleep(0.5)
+
+        self.assertEqual(writer.conflicts, {}, "Записувач не конфліктує сам із собою")
+        self.assertEqual(self.store.load('cart'), (b'2', 2), "Збережено останній знімок")
+
 class TestOrder(unittest.TestCase):
     def setUp(self):
         self.product = Product(name='Test', price=123.45, available_amount=21)
@@ -86,6 +227,467 @@ class TestOrder(unittest.TestCase):
         self.assertEqual(self.product.available_amount, 16, "Після submit_cart_order кількість продукту зменшилась")
         self.assertEqual(len(self.cart.products), 0, "Корзина очищена після submit_cart_order")
 
+    def test_place_order_async_returns_shipping_id(self):
+        self.mock_shipping_service.create_shipping.return_value = 'shipping-1'
+        future = self.order.place_order_async(self.mock_shipping_type, executor=BoundedExecutor(1, 1))
+        self.assertEqual(self.product.available_amount, 16, "Товар зарезервовано одразу")
+        self.assertEqual(future.result(timeout=1), 'shipping-1', "Future повертає id доставки")
+
+    def test_place_order_async_failure_releases_stock(self):
+        self.mock_shipping_service.create_shipping.side_effect = ValueError("Shipping type is not available")
+        future = self.order.place_order_async(self.mock_shipping_type, executor=BoundedExecutor(1, 1))
+        with self.assertRaises(ValueError):
+            future.result(timeout=1)
+        self.assertEqual(self.product.available_amount, 21, "Резерв повернуто після помилки доставки")
+
+    def test_place_order_async_keeps_stock_of_queued_shipment(self):
+        repository = InMemoryShippingRepository()
+        repository.update_shipping_status = MagicMock(side_effect=ConnectionError("DynamoDB is unavailable"))
+        publisher = InMemoryShippingPublisher()
+        order = Order(self.cart, ShippingService(repository, publisher))
+
+        with self.assertLogs('services.service'):
+            future = order.place_order_async('Самовивіз', executor=BoundedExecutor(1, 1))
+            shipping_id = future.result(timeout=1)
+        self.assertEqual(publisher.poll_shipping(), [shipping_id], "Доставку поставлено в чергу")
+        self.assertEqual(self.product.available_amount, 16, "Резерв не повернуто для відправлення в черзі")
+
+    def test_failed_send_cancels_shipment(self):
+        repository = InMemoryShippingRepository()
+        publisher = MagicMock()
+        publisher.send_new_shipping.side_effect = TimeoutError("send timed out")
+        service = ShippingService(repository, publisher)
+        future = Order(self.cart, service, 'order-2').place_order_async('Самовивіз', executor=BoundedExecutor(1, 1))
+
+        with self.assertRaises(TimeoutError):
+            future.result(timeout=1)
+        self.assertEqual(self.product.available_amount, 21, "Резерв повернуто")
+        shipping_id = repository.get_shipping_by_order_id('order-2')['shipping_id']
+        self.assertEqual(service.check_status(shipping_id), 'failed', "Відправлення скасовано")
+        self.assertIsNone(service.process_shipping(shipping_id), "Скасоване відправлення не обробляється")
+
+    def test_place_order_async_fails_fast_when_saturated(self):
+        release = threading.Event()
+        executor = BoundedExecutor(1, 0)
+        executor.submit(release.wait)
+        try:
+            started = time.monotonic()
+            with self.assertRaises(ExecutorSaturatedError):
+                self.order.place_order_async(self.mock_shipping_type, executor=executor)
+            self.assertLess(time.monotonic() - started, 0.5, "Оформлення не блокується на повному виконавці")
+        finally:
+            release.set()
+        self.assertEqual(self.product.available_amount, 21, "Резерв повернуто")
+        self.assertTrue(self.cart.contains_product(self.product), "Корзину відновлено")
+
+
+class TestShippingBatch(unittest.TestCase):
+    def setUp(self):
+        self.repository = MagicMock()
+        self.publisher = MagicMock()
+        self.service = ShippingService(self.repository, self.publisher, max_receive_count=3)
+        self.repository.get_shipping.side_effect = lambda shipping_id: None if shipping_id == 'bad' else {
+            'due_date': '2999-01-01T00:00:00+00:00'
+        }
+
+    def test_bad_message_does_not_abort_batch(self):
+        self.publisher.poll_shipping_messages.return_value = [
+            {'body': 'bad', 'receipt_handle': 'h1', 'receive_count': 1},
+            {'body': 'good', 'receipt_handle': 'h2', 'receive_count': 1},
+        ]
+        result = self.service.process_shipping_batch()
+
+        self.assertEqual([r['success'] for r in result], [False, True], "Поганий запис не зупиняє пакет")
+        self.publisher.ack_shipping.assert_called_once_with(['h2'])
+        self.publisher.send_to_dead_letter.assert_not_called()
+
+    def test_deadline_uses_epoch_due_date(self):
+        self.repository.get_shipping.side_effect = lambda shipping_id: {
+            'due_date': 'not parsed', 'due_date_ms': 1_000,
+        }
+        self.service.process_shipping('s1', now_ms=999)
+        self.repository.update_shipping_status.assert_called_with('s1', 'completed', expires_at=ANY)
+        self.service.process_shipping('s1', now_ms=1_001)
+        self.repository.update_shipping_status.assert_called_with('s1', 'failed', expires_at=ANY)
+
+    def test_poison_message_goes_to_dead_letter(self):
+        self.publisher.poll_shipping_messages.return_value = [
+            {'body': 'bad', 'receipt_handle': 'h1', 'receive_count': 3},
+        ]
+        result = self.service.process_shipping_batch()
+
+        self.assertTrue(result[0]['dead_lettered'], "Отруйне повідомлення переміщено до DLQ")
+        self.publisher.send_to_dead_letter.assert_called_once()
+        self.publisher.ack_shipping.assert_called_once_with(['h1'])
+
+    def test_dead_letter_failure_does_not_abort_batch(self):
+        self.publisher.poll_shipping_messages.return_value = [
+            {'body': 'bad', 'receipt_handle': 'h1', 'receive_count': 3},
+            {'body': 'good', 'receipt_handle': 'h2', 'receive_count': 1},
+        ]
+        self.publisher.send_to_dead_letter.side_effect = ConnectionError("DLQ is unavailable")
+        with self.assertLogs('services.service'):
+            result = self.service.process_shipping_batch()
+
+        self.assertFalse(result[0]['dead_lettered'], "Повідомлення залишилось у черзі")
+        self.publisher.ack_shipping.assert_called_once_with(['h2'])
+
+
+    def test_backend_outage_does_not_dead_letter(self):
+        self.publisher.poll_shipping_messages.return_value = [
+            {'body': 'good', 'receipt_handle': 'h1', 'receive_count': 5},
+        ]
+        self.repository.get_shipping.side_effect = ConnectionError("DynamoDB is unavailable")
+        result = self.service.process_shipping_batch()
+
+        self.assertFalse(result[0]['dead_lettered'], "Тимчасова помилка не робить повідомлення отруйним")
+        self.publisher.send_to_dead_letter.assert_not_called()
+        self.publisher.ack_shipping.assert_not_called()
+
+
+class TestShippingArchive(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.TemporaryDirectory()
+        self.archive = ShippingArchive(self.root.name)
+
+    def tearDown(self):
+        self.root.cleanup()
+
+    def test_archiver_moves_finished_shipments(self):
+        repository = MagicMock()
+        repository.scan_finished_shipping.return_value = iter([
+            {'shipping_id': 's1', 'created_date': '2026-01-02T10:00:00+00:00', 'shipping_status': 'completed'},
+            {'shipping_id': 's2', 'created_date': '2026-01-03T10:00:00+00:00', 'shipping_status': 'failed'},
+        ])
+        archiver = ShippingArchiver(repository, self.archive, ShippingService.TERMINAL_STATUSES, lead_time=3600)
+
+        self.assertEqual(archiver.run(now=1_000), 2, "Архівовано обидва відправлення")
+        repository.scan_finished_shipping.assert_called_once_with(list(ShippingService.TERMINAL_STATUSES), 4_600)
+        repository.delete_shipping_batch.assert_called_once_with(['s1', 's2'])
+        reopened = ShippingArchive(self.root.name)
+        self.assertEqual(reopened.get('s2')['shipping_status'], 'failed', "Відправлення читається з архіву")
+        self.assertIsNone(reopened.get('missing'), "Невідомий id відсутній в архіві")
+
+    def test_reader_sees_shipments_archived_later(self):
+        reader = ShippingArchive(self.root.name)
+        self.assertIsNone(reader.get('s1'), "Відправлення ще не архівоване")
+
+        self.archive.write([{'shipping_id': 's1', 'created_date': '2026-01-02', 'shipping_status': 'completed'}])
+        self.assertEqual(reader.get('s1')['shipping_status'], 'completed', "Читач бачить нові записи архіву")
+
+    def test_index_cache_is_bounded(self):
+        reader = ShippingArchive(self.root.name, cached_buckets=2)
+        self.archive.write([{'shipping_id': f's{n}', 'created_date': '2026-01-02'} for n in range(50)])
+        for n in range(50):
+            self.assertIsNotNone(reader.get(f's{n}'))
+        self.assertLessEqual(len(reader._cache), 2, "Кеш індексу обмежений")
+
+    def test_lookup_reads_only_its_gzip_member(self):
+        self.archive.write([{'shipping_id': 's1', 'created_date': '2026-01-02'}])
+        self.archive.write([{'shipping_id': 's2', 'created_date': '2026-01-02'},
+                            {'shipping_id': 's3', 'created_date': '2026-01-02'}])
+        partition, offset, line = self.archive._load_bucket(self.archive._bucket_of('s3'))['s3']
+        self.assertEqual((partition, line), ('dt=2026-01-02', 1), "Індекс зберігає розділ і рядок")
+        self.assertGreater(offset, 0, "Індекс вказує на другий gzip-блок")
+        self.assertEqual(self.archive.get('s3')['shipping_id'], 's3', "Запис знайдено за зміщенням")
+        self.assertEqual(self.archive.get('s1')['shipping_id'], 's1', "Перший блок читається з початку")
+
+    def test_terminal_status_sets_ttl(self):
+        repository = MagicMock()
+        service = ShippingService(repository, MagicMock(), ttl_seconds=60)
+        service.complete_shipping('s1')
+        expires_at = repository.update_shipping_status.call_args.kwargs['expires_at']
+        self.assertGreater(expires_at, datetime.now(timezone.utc).timestamp(), "TTL встановлено в майбутньому")
+
+
+class TestAdaptivePollingPolicy(unittest.TestCase):
+    def setUp(self):
+        self.policy = AdaptivePollingPolicy(max_idle_delay=8)
+
+    def test_busy_queue_uses_full_batch_and_short_wait(self):
+        self.policy.update_depth(500)
+        self.assertEqual(self.policy.batch_size(), 10, "Повний пакет для завантаженої черги")
+        self.assertEqual(self.policy.wait_time(), self.policy.min_wait_time, "Коротке очікування для завантаженої черги")
+
+    def test_small_backlog_shrinks_batch(self):
+        self.policy.update_depth(3)
+        self.assertEqual(self.policy.batch_size(), 3, "Розмір пакета відповідає глибині черги")
+        self.assertEqual(self.policy.wait_time(), AdaptivePollingPolicy.MAX_WAIT_TIME, "Довге опитування для майже порожньої черги")
+
+    def test_empty_receives_back_off(self):
+        delays = []
+        for _ in range(6):
+            self.policy.record(0)
+            delays.append(self.policy.idle_delay())
+        self.assertEqual(delays, [0.0, 1.0, 2.0, 4.0, 8.0, 8.0], "Експоненційна затримка обмежена максимумом")
+        self.policy.record(5)
+        self.assertEqual(self.policy.idle_delay(), 0.0, "Затримка скидається після непорожнього отримання")
+
+
+class TestPrefetchingPublisher(unittest.TestCase):
+    def setUp(self):
+        with patch('services.publisher.boto3') as boto3:
+            self.client = boto3.client.return_value
+            self.client.create_queue.return_value = {'QueueUrl': 'url'}
+            self.publisher = ShippingPublisher(prefetch=True)
+
+    @staticmethod
+    def response(body):
+        return {'Messages': [{'Body': body, 'ReceiptHandle': body, 'Attributes': {'ApproximateReceiveCount': '1'}}]}
+
+    def test_prefetch_returns_next_batch(self):
+        self.client.receive_message.side_effect = [self.response('s1'), self.response('s2'), self.response('s3')]
+        self.assertEqual(self.publisher.poll_shipping(), ['s1'], "Перший пакет отримано напряму")
+        self.assertEqual(self.publisher.poll_shipping(), ['s2'], "Другий пакет взято з попереднього отримання")
+
+    def test_failed_prefetch_does_not_wedge_poller(self):
+        self.client.receive_message.side_effect = [
+            self.response('s1'), ConnectionError("transient"), self.response('s2'), self.response('s3'),
+        ]
+        self.publisher.poll_shipping()
+        with self.assertRaises(ConnectionError):
+            self.publisher.poll_shipping()
+        self.assertEqual(self.publisher.poll_shipping(), ['s2'], "Після помилки надсилається новий запит")
+
+
+    def test_close_releases_prefetched_messages(self):
+        self.client.receive_message.side_effect = [self.response('s1'), self.response('s2')]
+        self.publisher.poll_shipping()
+        self.publisher.close()
+
+        entries = self.client.change_message_visibility_batch.call_args.kwargs['Entries']
+        self.assertEqual(entries, [{'Id': '0', 'ReceiptHandle': 's2', 'VisibilityTimeout': 0}],
+                         "Попередньо отримане повідомлення повернуто до черги")
+        self.assertIsNone(self.publisher._prefetch_executor, "Потік попереднього отримання зупинено")
+
+    def test_receive_follows_polling_policy(self):
+        self.publisher.polling_policy = AdaptivePollingPolicy(max_idle_delay=8)
+        self.publisher._prefetch_executor = None
+        self.publisher.sleep = MagicMock()
+        self.client.get_queue_attributes.return_value = {'Attributes': {'ApproximateNumberOfMessages': '3'}}
+        self.client.receive_message.return_value = {}
+
+        for _ in range(3):
+            self.publisher.poll_shipping()
+
+        self.client.get_queue_attributes.assert_called_once()
+        self.client.receive_message.assert_called_with(QueueUrl='url', AttributeNames=['ApproximateReceiveCount'],
+                                                       MaxNumberOfMessages=10, WaitTimeSeconds=20)
+        first_call = self.client.receive_message.call_args_list[0].kwargs
+        self.assertEqual((first_call['MaxNumberOfMessages'], first_call['WaitTimeSeconds']), (3, 20),
+                         "Перший запит розміром з глибину черги")
+        self.publisher.sleep.assert_called_once_with(1.0)
+
+class TestCarrierRouting(unittest.TestCase):
+    def setUp(self):
+        self.registry = CarrierRegistry([
+            Carrier('Нова Пошта', queue_name='NovaPoshtaQueue', shards=4),
+            Carrier('Самовивіз'),
+        ])
+
+    def test_sharded_carrier_routes_stably(self):
+        queue = self.registry.queue_for('Нова Пошта', 'shipping-1')
+        self.assertIn(queue, self.registry.get('Нова Пошта').queue_names(), "Черга належить до шардів перевізника")
+        self.assertEqual(queue, self.registry.queue_for('Нова Пошта', 'shipping-1'), "Маршрутизація стабільна")
+
+    def test_service_sends_to_carrier_queue(self):
+        publisher = MagicMock()
+        repository = MagicMock()
+        repository.create_shipping.return_value = 'shipping-1'
+        service = ShippingService(repository, publisher, carriers=self.registry)
+        due_date = datetime.now(timezone.utc) + timedelta(minutes=1)
+
+        service.create_shipping('Нова Пошта', ['Product'], 'order', due_date)
+        publisher.send_new_shipping.assert_called_with(
+            'shipping-1', queue_name=self.registry.queue_for('Нова Пошта', 'shipping-1'))
+
+        service.create_shipping('Самовивіз', ['Product'], 'order', due_date)
+        publisher.send_new_shipping.assert_called_with('shipping-1', queue_name=None)
+
+        self.assertEqual(service.available_shipping_types(), ['Нова Пошта', 'Самовивіз'],
+                         "Доступні типи доставки беруться з реєстру перевізників")
+        with self.assertRaises(ValueError):
+            service.create_shipping('Укр Пошта', ['Product'], 'order', due_date)
+
+
+class TestCarrierWorkerPool(unittest.TestCase):
+    @staticmethod
+    def idle_service(queue_name):
+        service = MagicMock()
+        service.process_shipping_batch.side_effect = lambda batch_size: time.sleep(0.01) or []
+        return service
+
+    def test_every_routed_queue_has_a_consumer(self):
+        registry = CarrierRegistry([
+            Carrier('Нова Пошта', queue_name='NP', shards=4),
+            Carrier('Укр Пошта', queue_name='UP', shards=2, max_concurrency=3),
+            Carrier('Самовивіз'),
+        ])
+        polled = set()
+
+        def service_factory(queue_name):
+            polled.add(queue_name)
+            return self.idle_service(queue_name)
+
+        pool = CarrierWorkerPool(registry, service_factory)
+        pool.start()
+        pool.stop()
+
+        routed = {registry.queue_for(carrier.name, f"shipping-{n}") for carrier in registry for n in range(100)}
+        self.assertTrue(routed <= polled, "Кожна черга, куди маршрутизуються повідомлення, має споживача")
+
+    def test_shards_are_split_between_workers(self):
+        assignments = CarrierWorkerPool.assign_queues(Carrier('Нова Пошта', queue_name='NP', shards=5,
+                                                              max_concurrency=2))
+        self.assertEqual(assignments, [['NP-0', 'NP-2', 'NP-4'], ['NP-1', 'NP-3']], "Шарди розподілено по воркерах")
+
+    def test_invalid_carrier_is_rejected(self):
+        with self.assertRaises(ValueError):
+            Carrier('Нова Пошта', queue_name='NP', max_concurrency=0)
+
+    def test_failing_batches_back_off(self):
+        service = MagicMock()
+        service.process_shipping_batch.side_effect = ConnectionError("backend is down")
+        pool = CarrierWorkerPool(CarrierRegistry([Carrier('Самовивіз')]), lambda queue_name: service,
+                                 error_backoff=0.05)
+        with self.assertLogs('services.workers', level='ERROR'):
+            pool.start()
+            time.sleep(0.3)
+            pool.stop()
+        self.assertLessEqual(service.process_shipping_batch.call_count, 5, "Воркер не крутиться у циклі помилок")
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_acquire_waits_for_refill(self):
+        now = [0.0]
+        bucket = TokenBucket(rate=2, capacity=2, clock=lambda: now[0],
+                             sleep=lambda seconds: now.__setitem__(0, now[0] + seconds))
+        self.assertTrue(bucket.try_acquire(2), "Повний бакет видає токени")
+        self.assertFalse(bucket.try_acquire(1), "Порожній бакет відмовляє")
+        bucket.acquire(1)
+        self.assertAlmostEqual(now[0], 0.5, msg="Очікування відповідає швидкості поповнення")
+
+
+class TestResilientBackend(unittest.TestCase):
+    def setUp(self):
+        self.repository = InMemoryShippingRepository()
+        self.shipping_id = self.repository.create_shipping(
+            'Самовивіз', ['Product'], 'order', 'created', datetime.now(timezone.utc) + timedelta(minutes=1))
+
+    def wrap(self, backend, **kwargs):
+        kwargs.setdefault('sleep', lambda seconds: None)
+        return ResilientBackend(backend, **kwargs)
+
+    def test_retries_transient_failures(self):
+        flaky = FaultInjector(self.repository, failure_rate=0.5, seed=1)
+        backend = self.wrap(flaky, retry_policy=RetryPolicy(max_attempts=10, quota=100),
+                            breaker=CircuitBreaker(failure_threshold=50))
+        for _ in range(20):
+            self.assertEqual(backend.get_shipping(self.shipping_id)['shipping_id'], self.shipping_id)
+
+    def test_writes_are_not_retried(self):
+        down = FaultInjector(self.repository, failure_rate=1.0)
+        backend = self.wrap(down, breaker=CircuitBreaker(failure_threshold=50))
+        with self.assertRaises(ConnectionError):
+            backend.create_shipping('Самовивіз', ['Product'], 'order-2', 'created',
+                                    datetime.now(timezone.utc) + timedelta(minutes=1))
+        self.assertEqual(down.calls, 1, "Неідемпотентний запис не повторюється")
+
+        with self.assertRaises(ConnectionError):
+            backend.update_shipping_status(self.shipping_id, 'completed')
+        self.assertEqual(down.calls, 1 + 3, "Оновлення статусу повторюється")
+
+    def test_only_wrapped_clients_skip_botocore_retries(self):
+        config = get_client_config(read_timeout=2.0, max_attempts=1)
+        self.assertEqual(config.retries['max_attempts'], 1, "botocore не повторює запити під ResilientBackend")
+        self.assertEqual(config.read_timeout, 2.0, "Таймаут читання відповідає дедлайну")
+        self.assertGreater(get_client_config().retries['max_attempts'], 1, "Незагорнуті клієнти повторюють запити")
+
+    def test_checkout_is_bounded_by_backend_deadline(self):
+        slow = FaultInjector(self.repository, latency=0.5)
+        service = ShippingService.with_resilience(slow, InMemoryShippingPublisher())
+        service.repository.default_deadline = 0.05
+        cart = ShoppingCart()
+        cart.add_product(Product('Phone', 1000, 10), 1)
+
+        started = time.monotonic()
+        with self.assertRaises(DeadlineExceededError):
+            Order(cart, service, 'order-2').place_order('Самовивіз')
+        self.assertLess(time.monotonic() - started, 0.3, "Оформлення не чекає на повільний бекенд")
+
+    def test_breaker_fails_fast_when_backend_is_down(self):
+        down = FaultInjector(self.repository, failure_rate=1.0)
+        backend = self.wrap(down, breaker=CircuitBreaker(failure_threshold=3), retry_policy=RetryPolicy(max_attempts=1))
+        for _ in range(3):
+            with self.assertRaises(ConnectionError):
+                backend.get_shipping(self.shipping_id)
+        calls = down.calls
+        with self.assertRaises(CircuitOpenError):
+            backend.get_shipping(self.shipping_id)
+        self.assertEqual(down.calls, calls, "Відкритий запобіжник не звертається до бекенду")
+
+    def test_deadline_bounds_slow_call(self):
+        slow = FaultInjector(self.repository, latency=0.5)
+        backend = self.wrap(slow, deadlines={'get_shipping': 0.05})
+        with self.assertRaises(DeadlineExceededError):
+            backend.get_shipping(self.shipping_id)
+
+    def test_hedged_read_avoids_slow_tail(self):
+        tail = FaultInjector(self.repository, slow_rate=0.04, slow_latency=0.3, seed=3)
+        backend = self.wrap(tail, deadlines={'get_shipping': 1.0})
+        for _ in range(30):
+            backend.get_shipping(self.shipping_id)
+        slowest = 0.0
+        for _ in range(50):
+            started = time.monotonic()
+            backend.get_shipping(self.shipping_id)
+            slowest = max(slowest, time.monotonic() - started)
+        self.assertLess(slowest, 0.2, "Дубльований запит обмежує хвіст затримки")
+
+
+class TestShippingProfiler(unittest.TestCase):
+    def test_profiled_batch_writes_stacks_and_allocations(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            profiler = ShippingProfiler(output_dir, StackSampler(interval=0.001), AllocationTracker(every=1))
+            publisher = InMemoryShippingPublisher()
+            repository = InMemoryShippingRepository()
+            service = ShippingService(repository, publisher, profiler=profiler)
+            for number in range(20):
+                shipping_id = repository.create_shipping(
+                    'Самовивіз', ['Product'], f'order-{number}', 'created',
+                    datetime.now(timezone.utc) + timedelta(minutes=1))
+                publisher.send_new_shipping(shipping_id)
+
+            profiler.start()
+            while service.process_shipping_batch():
+                time.sleep(0.01)
+            profiler.stop()
+
+            with open(f"{output_dir}/stacks.collapsed", encoding="utf-8") as stacks:
+                lines = stacks.read().splitlines()
+            self.assertTrue(lines, "Записано згорнуті стеки")
+            self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in lines), "Формат сумісний з flamegraph")
+            self.assertTrue(profiler.allocations.top_sites, "Зібрано місця алокацій")
+
+    def test_tracing_is_limited_to_sampled_batches(self):
+        tracker = AllocationTracker(every=2)
+        observed = []
+        for _ in range(4):
+            with tracker.track():
+                observed.append(tracemalloc.is_tracing())
+        self.assertEqual(observed, [False, True, False, True], "Трасування лише у вибраних пакетах")
+        self.assertFalse(tracemalloc.is_tracing(), "Трасування вимкнено після пакета")
+
+
+    def test_failed_batch_is_counted_and_flushed(self):
+        with tempfile.TemporaryDirectory() as output_dir:
+            profiler = ShippingProfiler(output_dir, flush_every=1)
+            with self.assertRaises(ConnectionError):
+                with profiler.batch():
+                    raise ConnectionError("backend is down")
+            self.assertEqual(profiler.batches, 1, "Невдалий пакет враховано")
+            with open(f"{output_dir}/allocations.txt", encoding="utf-8") as allocations:
+                self.assertIn("all threads", allocations.readline(), "Звіт позначено як загальнопроцесний")
 
 if __name__ == '__main__':
     unittest.main()